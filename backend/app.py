@@ -1,33 +1,175 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Header, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import Optional
 import base64
-import numpy as np
-from io import BytesIO
-import cv2
-from PIL import Image
 
 import os
-import aiofiles
-import re
+import asyncio
+import hashlib
+import hmac
+import json
+import threading
 import traceback
 
 from model_loader import ModelLoader
 from video_preprocessor import VideoPreprocessor
+from inference_executor import InferenceExecutor, QueueFullError
+from batch_scheduler import BatchScheduler
+from model_registry import ModelRegistry
+from inference_backends import INFERENCE_BACKENDS
+from result_cache import ResultCache, hash_file
+from tensor_store import TensorStore
+from stream_session import StreamSession
+from face_tracker import FaceTracker
+from video_source import decode_image
 
 
 app = FastAPI(title="LumaVoice API", description="AI-powered sign language recognition")
 
 # === Config ===
-STATIC_DATA_PATH = "/home/poras9868/data"  # Update this if needed
+STATIC_DATA_PATH = os.environ.get('LUMAVOICE_DATA_PATH', "/home/poras9868/data")  # Update this if needed
+TEST_VIDEOS_PATH = os.environ.get('LUMAVOICE_TEST_VIDEOS_PATH', os.path.join(STATIC_DATA_PATH, 'recordings', 'data'))
+MODEL_PATH = os.environ.get('LUMAVOICE_MODEL_PATH', '/home/poras9868/predict_model.h5')
+ENCODER_PATH = os.environ.get('LUMAVOICE_ENCODER_PATH', '/home/poras9868/label_encoder.pkl')
+# Inference runtime: 'auto' (by model file extension), 'keras', 'onnx' or 'tflite' (see inference_backends.py)
+INFERENCE_BACKEND = os.environ.get('LUMAVOICE_INFERENCE_BACKEND', 'auto')
+# Session options for each backend (0 threads keeps the runtime's default)
+BACKEND_OPTIONS = {
+    'keras': {
+        'intra_op_threads': int(os.environ.get('LUMAVOICE_KERAS_INTRA_OP_THREADS', 0)),
+        'inter_op_threads': int(os.environ.get('LUMAVOICE_KERAS_INTER_OP_THREADS', 0)),
+        'jit_compile': os.environ.get('LUMAVOICE_KERAS_XLA', '0') == '1'
+    },
+    'onnx': {
+        'intra_op_threads': int(os.environ.get('LUMAVOICE_ONNX_INTRA_OP_THREADS', 0)),
+        'inter_op_threads': int(os.environ.get('LUMAVOICE_ONNX_INTER_OP_THREADS', 0)),
+        'graph_optimization': os.environ.get('LUMAVOICE_ONNX_GRAPH_OPTIMIZATION', 'all')  # disable/basic/extended/all
+    },
+    'tflite': {
+        'num_threads': int(os.environ.get('LUMAVOICE_TFLITE_THREADS', 0))
+    }
+}
+# Load the model and face aligner on a background thread at startup; when off they load on first use
+PRELOAD_MODELS = os.environ.get('LUMAVOICE_PRELOAD_MODELS', '1') != '0'
+
+# Model registry: hot swaps and canary traffic (the admin endpoints stay off without a token)
+ADMIN_TOKEN = os.environ.get('LUMAVOICE_ADMIN_TOKEN')
+MODEL_DRAIN_TIMEOUT = float(os.environ.get('LUMAVOICE_MODEL_DRAIN_TIMEOUT', 30))  # Seconds a replaced model may finish requests
+CANDIDATE_MODEL_PATH = os.environ.get('LUMAVOICE_CANDIDATE_MODEL_PATH')  # Loaded at startup as the canary when set
+CANDIDATE_ENCODER_PATH = os.environ.get('LUMAVOICE_CANDIDATE_ENCODER_PATH', ENCODER_PATH)
+CANDIDATE_FRACTION = float(os.environ.get('LUMAVOICE_CANDIDATE_FRACTION', 0.1))
 
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'webm'}
 MAX_CONTENT_LENGTH = 100 * 1024 * 1024  # 100MB max
+# Whole request bodies, the video plus the multipart framing and form fields
+MAX_REQUEST_BODY = MAX_CONTENT_LENGTH + 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # Uploads are validated and hashed 1MB at a time
+
+# Container families each extension may contain, checked against the file's magic bytes
+EXTENSION_CONTAINERS = {
+    'mp4': {'isobmff'},
+    'mov': {'isobmff', 'quicktime'},
+    'mkv': {'matroska'},
+    'webm': {'matroska'},
+    'avi': {'avi'}
+}
+
+# Inference stage: worker pools and admission limit
+PREPROCESS_WORKERS = int(os.environ.get('LUMAVOICE_PREPROCESS_WORKERS', 2))
+INFERENCE_WORKERS = int(os.environ.get('LUMAVOICE_INFERENCE_WORKERS', 1))
+MAX_QUEUE_DEPTH = int(os.environ.get('LUMAVOICE_MAX_QUEUE_DEPTH', 8))
+
+# Micro-batching of concurrent /predict requests into one forward pass
+BATCH_MAX_SIZE = int(os.environ.get('LUMAVOICE_BATCH_MAX_SIZE', 8))
+BATCH_MAX_WAIT_MS = float(os.environ.get('LUMAVOICE_BATCH_MAX_WAIT_MS', 10))
+
+# CTC decoding: greedy by default, beam search per request
+DECODE_MODES = {'greedy', 'beam'}
+DEFAULT_BEAM_WIDTH = int(os.environ.get('LUMAVOICE_BEAM_WIDTH', 8))
+MAX_BEAM_WIDTH = 64
+
+# Mouth crop: 'keyframe' (detect every N frames) or 'track' (optical flow between detections)
+CROP_MODE = os.environ.get('LUMAVOICE_CROP_MODE', 'keyframe')
+# Face detector seeding the landmarks: 'sfd', 'blazeface', 'haar' or 'cached' (see face_detectors.py)
+FACE_DETECTOR = os.environ.get('LUMAVOICE_FACE_DETECTOR', 'sfd')
+# Uploads recorded faster than the training frame rate are resampled to it (0 keeps every frame)
+TARGET_FPS = float(os.environ.get('LUMAVOICE_TARGET_FPS', 25))
+# Faces are detected on frames downscaled to this width, crops are still cut at full resolution (0 disables)
+DETECT_WIDTH = int(os.environ.get('LUMAVOICE_DETECT_WIDTH', 640))
+# In keyframe mode, landmarks are re-detected every this many frames
+RECALIBRATE_EVERY = int(os.environ.get('LUMAVOICE_RECALIBRATE_EVERY', 30))
+# Keyframes sent through face detection as one batch (1 disables batching)
+LANDMARK_BATCH_SIZE = int(os.environ.get('LUMAVOICE_LANDMARK_BATCH_SIZE', 1))
+
+# Result cache: predictions and preprocessed clips keyed by the video's content hash
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('LUMAVOICE_RESULT_CACHE_MAX_ENTRIES', 1024))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('LUMAVOICE_RESULT_CACHE_MAX_MB', 256)) * 1024 * 1024
+RESULT_CACHE_DIR = os.environ.get('LUMAVOICE_RESULT_CACHE_DIR') or None  # Unset keeps the cache in memory only
+RESULT_CACHE_MAX_DISK_BYTES = int(os.environ.get('LUMAVOICE_RESULT_CACHE_MAX_DISK_MB', 2048)) * 1024 * 1024
+RESULT_CACHE_TENSORS = os.environ.get('LUMAVOICE_RESULT_CACHE_TENSORS', '1') != '0'  # Also keep preprocessed clips
+
+# Precomputed clips for the static test corpus, written by precompute_tensors.py
+TENSOR_STORE_DIR = os.environ.get('LUMAVOICE_TENSOR_STORE_DIR', 'tensor_store')
+
+# Live streaming over /ws/predict: a partial transcript every STREAM_STRIDE frames
+STREAM_STRIDE = int(os.environ.get('LUMAVOICE_STREAM_STRIDE', 15))
+STREAM_MIN_FRAMES = int(os.environ.get('LUMAVOICE_STREAM_MIN_FRAMES', 15))
+MAX_STREAMS = int(os.environ.get('LUMAVOICE_MAX_STREAMS', 4))
+MAX_STREAM_FRAME_BYTES = 2 * 1024 * 1024  # One encoded frame per message
+
+# Face overlay: per-session face boxes so repeat calls only run landmark regression
+MAX_FACE_SESSIONS = int(os.environ.get('LUMAVOICE_MAX_FACE_SESSIONS', 256))
+FACE_SESSION_TTL = int(os.environ.get('LUMAVOICE_FACE_SESSION_TTL', 300))  # Seconds without a frame
 
 # === Middleware ===
+class BodySizeLimitMiddleware:
+    """Reject request bodies over ``max_bytes`` before the server takes them in
+
+    FastAPI parses a multipart form (spooling big files to disk) before the
+    endpoint runs, so a limit checked there comes after the whole upload has
+    arrived. A declared Content-Length over the limit is answered with 413
+    at once; a body without one (chunked) is counted as it streams in and
+    cut off with 413 as soon as it passes the limit.
+    """
+
+    def __init__(self, app, max_bytes):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    def _too_large(self):
+        return HTTPException(status_code=413, detail=f'File too large, max {MAX_CONTENT_LENGTH // (1024 * 1024)}MB')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        declared = dict(scope['headers']).get(b'content-length', b'')
+        if declared.isdigit() and int(declared) > self.max_bytes:
+            error = self._too_large()
+            response = JSONResponse({'detail': error.detail}, status_code=error.status_code)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > self.max_bytes:
+                    raise self._too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+# Added before CORS so CORS wraps it and 413 responses still carry the CORS headers
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=MAX_REQUEST_BODY)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -49,40 +191,217 @@ else:
 # === Ensure upload directory exists ===
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-# === Load model and preprocessor ===
-model_loader = ModelLoader()
-video_preprocessor = VideoPreprocessor()
+# === Model and preprocessor (the heavy parts load at startup, see preload_models) ===
+model_loader = ModelLoader(
+    warmup_batch_sizes=sorted({1, BATCH_MAX_SIZE}),
+    beam_width=DEFAULT_BEAM_WIDTH,
+    model_path=MODEL_PATH,
+    encoder_path=ENCODER_PATH,
+    load=False,
+    backend=INFERENCE_BACKEND,
+    backend_options=BACKEND_OPTIONS
+)
+video_preprocessor = VideoPreprocessor(
+    crop_mode=CROP_MODE,
+    face_detector=FACE_DETECTOR,
+    target_fps=TARGET_FPS,
+    detect_width=DETECT_WIDTH,
+    recalibrate_every=RECALIBRATE_EVERY,
+    landmark_batch_size=LANDMARK_BATCH_SIZE
+)
+inference_executor = InferenceExecutor(
+    preprocess_workers=PREPROCESS_WORKERS,
+    inference_workers=INFERENCE_WORKERS,
+    max_queue_depth=MAX_QUEUE_DEPTH
+)
+model_registry = ModelRegistry(
+    lambda loader: BatchScheduler(
+        loader.predict_batch,
+        executor=inference_executor.inference_pool,
+        max_batch_size=BATCH_MAX_SIZE,
+        max_wait_ms=BATCH_MAX_WAIT_MS
+    ),
+    drain_timeout=MODEL_DRAIN_TIMEOUT,
+    warmup_batch_sizes=sorted({1, BATCH_MAX_SIZE}),
+    beam_width=DEFAULT_BEAM_WIDTH,
+    backend_options=BACKEND_OPTIONS
+)
+model_registry.register(model_loader)
+result_cache = ResultCache(
+    max_entries=RESULT_CACHE_MAX_ENTRIES,
+    max_bytes=RESULT_CACHE_MAX_BYTES,
+    disk_dir=RESULT_CACHE_DIR,
+    max_disk_bytes=RESULT_CACHE_MAX_DISK_BYTES
+)
+tensor_store = TensorStore(TENSOR_STORE_DIR, STATIC_DATA_PATH, video_preprocessor.cache_config())
+face_tracker = FaceTracker(video_preprocessor, max_sessions=MAX_FACE_SESSIONS, ttl_seconds=FACE_SESSION_TTL)
+active_streams = 0
 
 # === Helper ===
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def sniff_container(header):
+    """Identify the video container from the first bytes of a file, None if unknown"""
+    if header[4:8] == b'ftyp':
+        return 'isobmff'  # MP4 / modern QuickTime
+    if header[4:8] in (b'moov', b'mdat', b'wide', b'free', b'skip'):
+        return 'quicktime'  # Older QuickTime atoms
+    if header[:4] == b'\x1a\x45\xdf\xa3':
+        return 'matroska'  # MKV / WebM (EBML header)
+    if header[:4] == b'RIFF' and header[8:12] == b'AVI ':
+        return 'avi'
+    return None
+
+def parse_decode_options(decode_mode, beam_width, grammar):
+    """Validate the per-request CTC decoding options, raises a 400 on bad values"""
+    if decode_mode not in DECODE_MODES:
+        raise HTTPException(status_code=400, detail=f'decode_mode must be one of {sorted(DECODE_MODES)}')
+    if beam_width is not None and not 1 <= beam_width <= MAX_BEAM_WIDTH:
+        raise HTTPException(status_code=400, detail=f'beam_width must be between 1 and {MAX_BEAM_WIDTH}')
+    tries = model_registry.active_loader().tries
+    if grammar is not None and grammar not in tries:
+        raise HTTPException(status_code=400, detail=f'grammar must be one of {sorted(tries)}')
+    return {'mode': decode_mode, 'beam_width': beam_width, 'grammar': grammar}
+
+def require_admin(token):
+    """Guard for the model admin endpoints"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail='Model admin endpoints are disabled, set LUMAVOICE_ADMIN_TOKEN')
+    if not token or not hmac.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail='Invalid admin token')
+
+async def ensure_model_loaded():
+    """Wait for the startup load, or load on this first request when preloading is off"""
+    loader = model_registry.active_loader()
+    if loader.load_state != 'ready':
+        await asyncio.to_thread(loader.ensure_loaded)
+
+async def save_upload(video: UploadFile):
+    """Validate an upload in place, rejecting bad files
+
+    The request body is already in by now; its size was limited while it
+    arrived (see BodySizeLimitMiddleware) and Starlette spooled it into
+    ``video.file``, which is decoded from there with no second copy. Here
+    the extension is checked before anything is read, the magic bytes on the
+    first chunk, and the file's own size as it is read through. The SHA-256
+    of the content is computed along the way for the result cache. Returns
+    (file, size, sha256) with the file rewound; Starlette closes it once the
+    response is sent.
+    """
+    if not video.filename or not allowed_file(video.filename):
+        raise HTTPException(status_code=415, detail=f'Unsupported file type, allowed: {sorted(ALLOWED_EXTENSIONS)}')
+    extension = video.filename.rsplit('.', 1)[1].lower()
+
+    declared_size = getattr(video, 'size', None)
+    if declared_size is not None and declared_size > MAX_CONTENT_LENGTH:
+        raise HTTPException(status_code=413, detail=f'File too large, max {MAX_CONTENT_LENGTH // (1024 * 1024)}MB')
+
+    await video.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = await video.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        if size == 0 and sniff_container(chunk[:16]) not in EXTENSION_CONTAINERS[extension]:
+            raise HTTPException(status_code=415, detail=f'File content is not a valid .{extension} video')
+        size += len(chunk)
+        if size > MAX_CONTENT_LENGTH:
+            raise HTTPException(status_code=413, detail=f'File too large, max {MAX_CONTENT_LENGTH // (1024 * 1024)}MB')
+        digest.update(chunk)
+
+    if size == 0:
+        raise HTTPException(status_code=400, detail='Uploaded file is empty')
+
+    await video.seek(0)
+    return video.file, size, digest.hexdigest()
+
 # === Routes ===
 
 @app.get('/health')
 async def health_check():
     return {'status': 'healthy', 'message': 'LumaVoice API is running'}
 
+@app.get('/ready')
+async def readiness_check():
+    """Readiness, unlike /health: 200 only once the model and the face aligner are loaded"""
+    components = {
+        'model': model_registry.active_loader().load_state,
+        'face_alignment': 'ready' if video_preprocessor.is_warm() else 'not_loaded'
+    }
+    ready = all(state == 'ready' for state in components.values())
+    return JSONResponse(status_code=200 if ready else 503, content={'ready': ready, 'components': components})
+
+@app.on_event('startup')
+async def preload_models():
+    if CANDIDATE_MODEL_PATH:
+        model_registry.load(CANDIDATE_MODEL_PATH, CANDIDATE_ENCODER_PATH, role='candidate', fraction=CANDIDATE_FRACTION)
+    if not PRELOAD_MODELS:
+        return
+
+    def load():
+        model_loader.ensure_loaded()
+        try:
+            video_preprocessor.warmup()
+        except Exception as e:
+            print(f"[ERROR] Face alignment warm-up failed: {str(e)}")
+
+    threading.Thread(target=load, name='preload-models', daemon=True).start()
+
+@app.get('/queue/stats')
+async def queue_stats():
+    stats = inference_executor.get_stats()
+    models = model_registry.get_stats()
+    stats['batching'] = models['versions'][models['active']]['batching']
+    return stats
+
+@app.get('/cache/stats')
+async def cache_stats():
+    stats = result_cache.get_stats()
+    stats['tensor_store'] = tensor_store.get_stats()
+    return stats
+
+@app.get('/face/stats')
+async def face_stats():
+    return face_tracker.get_stats()
+
+@app.on_event('shutdown')
+async def shutdown_executor():
+    model_registry.stop()
+    inference_executor.shutdown(wait=False)
+
 from fastapi import Form
 
 @app.post('/predict')
 async def predict_video(
     video: UploadFile = File(None),  # Optional video upload
-    test_path: str = Form(None)      # Optional path from frontend test select
+    test_path: str = Form(None),     # Optional path from frontend test select
+    decode_mode: str = Form('greedy'),  # 'greedy' or 'beam'
+    beam_width: int = Form(None),       # Beam width, defaults to DEFAULT_BEAM_WIDTH
+    grammar: str = Form(None)           # Beam constraint: 'vocabulary' (default) or 'grid'
 ):
+    temp_path = None
+    model = None
+    content_hash = None
     try:
         if not video and not test_path:
             raise HTTPException(status_code=400, detail='No video or test_path provided')
 
-        if video:
-            # Handle uploaded video
-            filename = re.sub(r'[^a-zA-Z0-9._-]', '_', video.filename)
-            temp_path = os.path.join(UPLOAD_FOLDER, filename)
+        await ensure_model_loaded()
+        decode_options = parse_decode_options(decode_mode, beam_width, grammar)
+
+        # The version meant to serve this request: the active one, or the candidate for its
+        # share of traffic. It is only pinned once the clip is ready, so a slow upload or
+        # preprocessing run does not hold a version that is being swapped out
+        chosen = model_registry.choose()
+        model_version = chosen['loader'].model_version
 
-            print(f"[DEBUG] Saving uploaded file to: {temp_path}")
-            async with aiofiles.open(temp_path, 'wb') as buffer:
-                content = await video.read()
-                await buffer.write(content)
+        if video:
+            # Handle uploaded video: validated before taking a queue slot, then decoded
+            # straight from the file Starlette spooled it into
+            video_source, upload_size, content_hash = await save_upload(video)
+            print(f"[DEBUG] Received upload {video.filename!r}, {upload_size} bytes")
 
         # elif test_path:
         #     # Use static test video
@@ -92,19 +411,77 @@ async def predict_video(
             # Convert relative test_path to absolute path
             safe_relative_path = os.path.normpath(test_path).lstrip(os.sep)
             temp_path = os.path.join(STATIC_DATA_PATH, safe_relative_path.split("data/", 1)[-1])
+            video_source = temp_path
             print(f"[DEBUG] Using test video absolute path: {temp_path}")
 
-        # Preprocess video
-        processed_frames = video_preprocessor.process_video(temp_path)
-        print(f"[DEBUG] Processed {len(processed_frames)} frames")
-
-        # Predict
-        prediction = model_loader.predict(processed_frames)
-        print(f"[DEBUG] Prediction raw output: {prediction}")
-
-        # Cleanup uploaded file
-        if video and os.path.exists(temp_path):
-            os.remove(temp_path)
+        with inference_executor.slot():
+            if temp_path is not None and os.path.isfile(temp_path):
+                content_hash = await inference_executor.preprocess(hash_file, temp_path)
+
+            # The clip depends on the video and the preprocessing settings; the prediction
+            # additionally on the model weights and the decode options
+            tensor_key = result_key = None
+            if content_hash is not None:
+                preprocess_config = video_preprocessor.cache_config()
+                tensor_key = ResultCache.make_key(content_hash, preprocess=preprocess_config)
+                if model_version is not None:
+                    result_key = ResultCache.make_key(
+                        content_hash,
+                        preprocess=preprocess_config,
+                        model=model_version,
+                        decode=decode_options
+                    )
+
+            cache_status = 'miss'
+            prediction = await asyncio.to_thread(result_cache.get, result_key) if result_key else None
+            if prediction is not None:
+                cache_status = 'result'
+                frames_processed = 0
+                print(f"[DEBUG] Result cache hit for {content_hash[:12]}")
+            else:
+                processed_frames = None
+                if tensor_key and RESULT_CACHE_TENSORS:
+                    processed_frames = await asyncio.to_thread(result_cache.get, tensor_key)
+                    if processed_frames is not None:
+                        cache_status = 'tensor'
+                        print(f"[DEBUG] Tensor cache hit for {content_hash[:12]}")
+                if processed_frames is None and temp_path is not None:
+                    # Test corpus clip precomputed by precompute_tensors.py, memory-mapped from disk
+                    processed_frames = await asyncio.to_thread(tensor_store.load_model_input, temp_path)
+                    if processed_frames is not None:
+                        cache_status = 'store'
+                        print(f"[DEBUG] Loaded precomputed clip for {temp_path}")
+                if processed_frames is None:
+                    # Preprocess video (CPU-heavy, runs on the preprocessing pool)
+                    preprocess_stats = {}
+                    processed_frames = await inference_executor.preprocess(
+                        video_preprocessor.process_video, video_source, stats=preprocess_stats
+                    )
+                    if 'error' in preprocess_stats:
+                        # The all-zero clip it returns must not be predicted on or cached under this content
+                        print(f"[WARN] {preprocess_stats['error']}")
+                        raise HTTPException(status_code=422, detail='Video could not be decoded')
+                    if tensor_key and RESULT_CACHE_TENSORS:
+                        await asyncio.to_thread(result_cache.put, tensor_key, processed_frames)
+                frames_processed = len(processed_frames)
+                print(f"[DEBUG] Processed {frames_processed} frames")
+
+                # Predict (micro-batched with concurrent requests, runs on the inference pool)
+                model = model_registry.acquire(chosen)
+                if model is not chosen and result_key is not None:
+                    # Swapped while the clip was prepared; cache under the version that ran it
+                    result_key = ResultCache.make_key(
+                        content_hash,
+                        preprocess=preprocess_config,
+                        model=model['loader'].model_version,
+                        decode=decode_options
+                    )
+                prediction = await asyncio.wrap_future(model_registry.submit(model, processed_frames, decode_options))
+                print(f"[DEBUG] Prediction raw output: {prediction}")
+
+                # Failed predictions are not cached so a retry gets a fresh attempt
+                if result_key and isinstance(prediction, dict) and 'error' not in prediction:
+                    await asyncio.to_thread(result_cache.put, result_key, prediction)
 
         return {
             'success': True,
@@ -112,23 +489,149 @@ async def predict_video(
             'confidence': prediction.get('confidence', 0) if isinstance(prediction, dict) else 0,
             'detected_text': prediction.get('text', '') if isinstance(prediction, dict) else str(prediction),
             'processing_info': {
-                'frames_processed': len(processed_frames),
-                'video_duration': prediction.get('duration', 0) if isinstance(prediction, dict) else 0
+                'frames_processed': frames_processed,
+                'video_duration': prediction.get('duration', 0) if isinstance(prediction, dict) else 0,
+                'inference_ms': prediction.get('inference_ms', 0) if isinstance(prediction, dict) else 0,
+                'batch_size': prediction.get('batch_size', 1) if isinstance(prediction, dict) else 1,
+                'decode_mode': prediction.get('decode_mode', decode_mode) if isinstance(prediction, dict) else decode_mode,
+                'cache': cache_status,
+                'model_version': (model or chosen)['name']
             }
         }
 
+    except QueueFullError as e:
+        print(f"[WARN] {str(e)}")
+        raise HTTPException(status_code=503, detail='Server busy, please retry shortly', headers={'Retry-After': '1'})
+
+    except HTTPException:
+        raise
+
     except Exception as e:
         print(f"[ERROR] {str(e)}")
-        import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
+    finally:
+        if model is not None:
+            model_registry.release(model)
+
+
+@app.websocket('/ws/predict')
+async def predict_stream(websocket: WebSocket):
+    """Live lip reading over a WebSocket
+
+    The client sends one frame per message, either as a binary encoded image
+    (JPEG/PNG) or as JSON ``{"image": "<data URL>"}``. Every ``stride`` frames
+    the server replies with ``{"type": "partial", ...}`` for the latest
+    75-frame window. ``{"type": "end"}`` asks for a final transcript and
+    ``{"type": "reset"}`` starts a new utterance. Query parameters: stride,
+    decode_mode, beam_width, grammar.
+    """
+    global active_streams
+    await websocket.accept()
+    if active_streams >= MAX_STREAMS:
+        await websocket.close(code=1013, reason='Server busy, please retry shortly')
+        return
+
+    # Counted right after the check, with no await in between, so concurrent connects cannot go past MAX_STREAMS
+    active_streams += 1
+    pending = None  # Partial transcript in flight, at most one per stream
+    try:
+        await ensure_model_loaded()
+
+        params = websocket.query_params
+        try:
+            stride = int(params.get('stride', STREAM_STRIDE))
+            if not 1 <= stride <= video_preprocessor.max_frames:
+                raise ValueError(f'stride must be between 1 and {video_preprocessor.max_frames}')
+            beam_width = int(params['beam_width']) if 'beam_width' in params else None
+            decode_options = parse_decode_options(params.get('decode_mode', 'greedy'), beam_width, params.get('grammar'))
+        except (ValueError, HTTPException) as e:
+            await websocket.close(code=1008, reason=str(getattr(e, 'detail', e)))
+            return
+
+        session = StreamSession(video_preprocessor, stride=stride, min_frames=min(STREAM_MIN_FRAMES, stride))
+
+        async def transcribe(kind, clip, stats):
+            model = model_registry.acquire()
+            try:
+                prediction = await asyncio.wrap_future(model_registry.submit(model, clip, decode_options))
+                await websocket.send_json({
+                    'type': kind,
+                    'text': prediction.get('text', ''),
+                    'confidence': prediction.get('confidence', 0),
+                    'inference_ms': prediction.get('inference_ms', 0),
+                    **stats
+                })
+            except Exception as e:
+                print(f"[ERROR] Stream {kind} transcript failed: {str(e)}")
+            finally:
+                model_registry.release(model)
+
+        while True:
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+
+            data = message.get('bytes')
+            if data is None:
+                try:
+                    payload = json.loads(message.get('text') or '')
+                    if not isinstance(payload, dict):
+                        raise ValueError('JSON message is not an object')
+                except ValueError:
+                    await websocket.send_json({'type': 'error', 'detail': 'Expected a binary frame or a JSON message'})
+                    continue
+
+                if payload.get('type') == 'end':
+                    if pending is not None:
+                        await pending
+                    await transcribe('final', session.window(), session.get_stats())
+                    continue
+                if payload.get('type') == 'reset':
+                    if pending is not None:
+                        await pending
+                    session.reset()
+                    continue
+
+                image = payload.get('image')
+                if not image or not isinstance(image, str):
+                    await websocket.send_json({'type': 'error', 'detail': 'Message has no image'})
+                    continue
+                try:
+                    data = base64.b64decode(image.split(',')[-1])
+                except ValueError:  # binascii.Error
+                    await websocket.send_json({'type': 'error', 'detail': 'Image is not valid base64'})
+                    continue
+
+            if len(data) > MAX_STREAM_FRAME_BYTES:
+                await websocket.send_json({'type': 'error', 'detail': 'Frame too large'})
+                continue
+
+            try:
+                # Decode and crop on the preprocessing pool
+                due = await inference_executor.preprocess(session.add_frame, data)
+            except ValueError as e:
+                await websocket.send_json({'type': 'error', 'detail': str(e)})
+                continue
+
+            # While a partial is still in the model, skip this one rather than queue up behind it
+            if due and (pending is None or pending.done()):
+                pending = asyncio.create_task(transcribe('partial', session.window(), session.get_stats()))
+
+    except WebSocketDisconnect:
+        pass
+
+    finally:
+        active_streams -= 1
+        if pending is not None and not pending.done():
+            pending.cancel()
 
 
 @app.get('/test-videos')
 async def get_test_videos():
     try:
-        base_path = '/home/poras9868/data/recordings/data'  # <-- Absolute path
+        base_path = TEST_VIDEOS_PATH
 
         result = {'folders': [], 'videos': {}}
 
@@ -152,72 +655,182 @@ async def get_test_videos():
 @app.get('/model/info')
 async def model_info():
     try:
-        info = model_loader.get_model_info()
+        info = model_registry.active_loader().get_model_info()
         return {
             'model_loaded': info.get('loaded'),
             'model_type': info.get('type'),
             'input_shape': info.get('input_shape'),
-            'classes': info.get('classes', [])  # Default to empty list if missing
+            'classes': info.get('classes', []),  # Default to empty list if missing
+            'inference_timing': info.get('inference_timing'),
+            'model_version': info.get('model_version')
         }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f'Failed to get model info: {str(e)}')
 
 
+@app.get('/models')
+async def list_models():
+    return model_registry.get_stats()
+
+@app.post('/models/load', status_code=202)
+async def load_model_version(
+    model_path: str = Form(...),
+    encoder_path: str = Form(None),
+    role: str = Form('candidate'),   # 'candidate' (canary) or 'active' (swapped in once warm)
+    fraction: float = Form(None),    # Share of traffic for a candidate
+    backend: str = Form('auto'),     # Inference backend, 'auto' picks it from the file extension
+    x_admin_token: str = Header(None)
+):
+    require_admin(x_admin_token)
+    if role not in ('candidate', 'active'):
+        raise HTTPException(status_code=400, detail="role must be 'candidate' or 'active'")
+    if fraction is not None and not 0.0 <= fraction <= 1.0:
+        raise HTTPException(status_code=400, detail='fraction must be between 0 and 1')
+    if backend != 'auto' and backend not in INFERENCE_BACKENDS:
+        raise HTTPException(status_code=400, detail=f'backend must be auto or one of {list(INFERENCE_BACKENDS)}')
+    if not os.path.isfile(model_path):
+        raise HTTPException(status_code=400, detail=f'Model file not found: {model_path}')
+    load_id = model_registry.load(model_path, encoder_path or ENCODER_PATH, role=role, fraction=fraction, backend=backend)
+    return {'load_id': load_id}
+
+@app.post('/models/promote')
+async def promote_model(x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    try:
+        return {'active': model_registry.promote()}
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post('/models/candidate/fraction')
+async def set_candidate_fraction(fraction: float = Form(...), x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    if not 0.0 <= fraction <= 1.0:
+        raise HTTPException(status_code=400, detail='fraction must be between 0 and 1')
+    model_registry.set_candidate_fraction(fraction)
+    return {'candidate_fraction': fraction}
+
+@app.delete('/models/candidate')
+async def remove_candidate_model(x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    return {'removed': model_registry.remove_candidate()}
+
+
 class DetectRequest(BaseModel):
     image: str
     video_path: Optional[str] = None
+    session_id: Optional[str] = None
+
+def detect_face_frame(image_bytes, session_id=None):
+    """Decode one encoded frame and find its landmarks and mouth crop (runs on the preprocessing pool)"""
+    frame = decode_image(image_bytes)
+    if frame is None:
+        raise ValueError('Image could not be decoded')
+    result = face_tracker.detect(frame, session_id)
+
+    landmark_points = []
+    if result['landmarks'] is not None:
+        for i, point in enumerate(result['landmarks']):
+            if i < 17:
+                landmark_points.append({
+                    'x': float(point[0]),
+                    'y': float(point[1]),
+                    'type': 'face',
+                    'confidence': 0.9
+                })
+            elif 48 <= i <= 67:
+                landmark_points.append({
+                    'x': float(point[0]),
+                    'y': float(point[1]),
+                    'type': 'mouth_outer' if i <= 59 else 'mouth_inner',
+                    'confidence': 0.95
+                })
+            # Add more types like eyes, nose if needed
+
+    if not landmark_points:
+        return {'landmarks': [], 'crop_region': None, 'tracked': False}
+
+    crop = result['crop']  # [y1, y2, x1, x2]
+    return {
+        'landmarks': landmark_points,
+        'crop_region': {
+            'x': crop[2],
+            'y': crop[0],
+            'width': crop[3] - crop[2],
+            'height': crop[1] - crop[0]
+        },
+        'tracked': result['tracked']
+    }
 
 @app.post("/api/detect-face")
-async def detect_face(data: DetectRequest):
+async def detect_face(request: Request):
+    """Landmarks and mouth crop for one video frame
+
+    Send the frame as a raw image body (Content-Type: image/jpeg or similar)
+    with the session in an X-Session-Id header or a session_id query
+    parameter, or as JSON {image: <data URL>, session_id, video_path}. With
+    JSON, video_path doubles as the session id when session_id is not given.
+    Frames of one session only run landmark regression from the previous
+    face box, falling back to full detection when tracking is lost.
+    """
     try:
-        # Decode base64 image
-        image_data = data.image.split(',')[1]
-        image_bytes = base64.b64decode(image_data)
-        image = Image.open(BytesIO(image_bytes))
-        frame = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-
-        preds = fa.get_landmarks(frame)
-
-        if preds and len(preds) > 0:
-            landmarks = preds[0]
-            landmark_points = []
-
-            for i, point in enumerate(landmarks):
-                if i < 17:
-                    landmark_points.append({
-                        'x': float(point[0]),
-                        'y': float(point[1]),
-                        'type': 'face',
-                        'confidence': 0.9
-                    })
-                elif 48 <= i <= 67:
-                    landmark_points.append({
-                        'x': float(point[0]),
-                        'y': float(point[1]),
-                        'type': 'mouth_outer' if i <= 59 else 'mouth_inner',
-                        'confidence': 0.95
-                    })
-                # Add more types like eyes, nose if needed
-
-            # Calculate crop region using your function
-            crop = measurements(frame)  # [y1, y2, x1, x2]
-
-            return {
-                'landmarks': landmark_points,
-                'crop_region': {
-                    'x': crop[2],
-                    'y': crop[0],
-                    'width': crop[3] - crop[2],
-                    'height': crop[1] - crop[0]
-                }
-            }
+        content_type = request.headers.get('content-type', '')
+        if content_type.startswith('image/') or content_type.startswith('application/octet-stream'):
+            image_bytes = await request.body()
+            session_id = request.headers.get('x-session-id') or request.query_params.get('session_id')
+        else:
+            data = DetectRequest(**(await request.json()))
+            image_bytes = base64.b64decode(data.image.split(',')[-1])
+            session_id = data.session_id or data.video_path
+
+        if len(image_bytes) > MAX_STREAM_FRAME_BYTES:
+            return {'error': 'Image too large', 'landmarks': [], 'crop_region': None}
+
+        return await inference_executor.preprocess(detect_face_frame, image_bytes, session_id)
 
-        return {'landmarks': [], 'crop_region': None}
-    
     except Exception as e:
         return {'error': str(e), 'landmarks': [], 'crop_region': None}
 
+@app.websocket('/ws/detect-face')
+async def detect_face_stream(websocket: WebSocket):
+    """Same as /api/detect-face with one frame per message; the connection is the session
+
+    A frame is either a binary message with the encoded image or a JSON text
+    message {image: <data URL>}, like /ws/predict accepts.
+    """
+    await websocket.accept()
+    session_id = f"ws-{id(websocket)}"
+    try:
+        while True:
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+
+            image_bytes = message.get('bytes')
+            if image_bytes is None:
+                try:
+                    payload = json.loads(message.get('text') or '')
+                    image_bytes = base64.b64decode(payload['image'].split(',')[-1])
+                except (ValueError, TypeError, KeyError, AttributeError):
+                    await websocket.send_json({'error': 'Expected a binary frame or a JSON message with an image',
+                                               'landmarks': [], 'crop_region': None})
+                    continue
+
+            if len(image_bytes) > MAX_STREAM_FRAME_BYTES:
+                await websocket.send_json({'error': 'Image too large', 'landmarks': [], 'crop_region': None})
+                continue
+            try:
+                result = await inference_executor.preprocess(detect_face_frame, image_bytes, session_id)
+            except Exception as e:
+                result = {'error': str(e), 'landmarks': [], 'crop_region': None}
+            await websocket.send_json(result)
+
+    except WebSocketDisconnect:
+        pass
+
+    finally:
+        face_tracker.end_session(session_id)
+
 
 # === Dev entrypoint ===
 if __name__ == '__main__':
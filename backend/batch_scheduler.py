@@ -0,0 +1,152 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class BatchScheduler:
+    """Groups concurrent inference requests into micro-batches.
+
+    Requests are collected for up to ``max_wait_ms`` after the first one
+    arrives, or until ``max_batch_size`` clips are waiting, then stacked into a
+    single tensor and handed to ``run_batch`` in one call. ``run_batch`` must
+    take a stacked ``(batch, ...)`` array plus a per-row ``decode_options``
+    list and return one result per row, as ``ModelLoader.predict_batch`` does.
+    Each caller gets a future resolving to its own row's result.
+
+    When an ``executor`` is given the batches run on it, so the collector can
+    keep forming the next batch while the current one is in the model.
+    """
+
+    def __init__(self, run_batch, executor=None, max_batch_size=8, max_wait_ms=10):
+        self.run_batch = run_batch
+        self.executor = executor
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._clips = 0
+        self._largest_batch = 0
+
+        self._thread = threading.Thread(target=self._collect_loop, name='batch-scheduler', daemon=True)
+        self._thread.start()
+
+    def submit(self, processed_frames, decode_options=None):
+        """Queue one preprocessed clip, returns a future for its result"""
+        future = Future()
+        if self._stopped.is_set():
+            future.set_exception(RuntimeError('Batch scheduler is stopped'))
+            return future
+
+        frames = np.asarray(processed_frames)
+        if frames.ndim == 4:
+            # Single clip without a batch dimension
+            frames = frames[np.newaxis]
+        self._queue.put((frames, decode_options, future))
+        return future
+
+    def _collect_loop(self):
+        while not self._stopped.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if first is None:
+                break
+
+            pending = [first]
+            rows = first[0].shape[0]
+            deadline = time.monotonic() + self.max_wait
+            while rows < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._stopped.set()
+                    break
+                pending.append(item)
+                rows += item[0].shape[0]
+
+            # Clips of different shapes cannot share a tensor
+            groups = {}
+            for item in pending:
+                frames = item[0]
+                groups.setdefault((frames.shape[1:], frames.dtype.str), []).append(item)
+
+            for items in groups.values():
+                if self.executor is None:
+                    self._run(items)
+                    continue
+                try:
+                    self.executor.submit(self._run, items)
+                except Exception as e:
+                    # e.g. the executor is shut down; fail these clips rather than the collector
+                    logging.error(f"Could not schedule batch: {str(e)}")
+                    for _, _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+
+    def _run(self, items):
+        # Callers that gave up (e.g. a closed stream cancelled its future) are left out;
+        # the rest can no longer be cancelled, so delivering their results cannot fail
+        items = [item for item in items if item[2].set_running_or_notify_cancel()]
+        if not items:
+            return
+        futures = [future for _, _, future in items]
+        try:
+            counts = [frames.shape[0] for frames, _, _ in items]
+            batch = items[0][0] if len(items) == 1 else np.concatenate([frames for frames, _, _ in items], axis=0)
+            row_options = [options for frames, options, _ in items for _ in range(frames.shape[0])]
+
+            results = self.run_batch(batch, decode_options=row_options)
+
+            with self._lock:
+                self._batches += 1
+                self._clips += batch.shape[0]
+                self._largest_batch = max(self._largest_batch, batch.shape[0])
+
+            offset = 0
+            for future, count in zip(futures, counts):
+                future.set_result(results[offset] if count == 1 else results[offset:offset + count])
+                offset += count
+
+        except Exception as e:
+            logging.error(f"Batch inference error: {str(e)}")
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+
+    def get_stats(self):
+        """Get batching counters"""
+        with self._lock:
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'queued': self._queue.qsize(),
+                'batches': self._batches,
+                'clips': self._clips,
+                'average_batch_size': (self._clips / self._batches) if self._batches else 0.0,
+                'largest_batch': self._largest_batch
+            }
+
+    def stop(self):
+        """Stop collecting; clips already queued are dropped"""
+        self._stopped.set()
+        self._queue.put(None)
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and not item[2].done():
+                item[2].set_exception(RuntimeError('Batch scheduler is stopped'))
@@ -0,0 +1,341 @@
+import numpy as np
+
+# Same value as tf.keras.backend.epsilon(), which ctc_decode adds before taking the log
+EPSILON = 1e-7
+
+
+def greedy_ctc_decode(y_pred, input_length=None, blank_index=None, epsilon=EPSILON):
+    """Greedy (best path) CTC decoding of a whole batch in NumPy
+
+    Mirrors ``tf.keras.backend.ctc_decode(..., greedy=True)``: take the argmax
+    class at every timestep, merge consecutive repeats, then drop blanks. The
+    blank is the last class unless ``blank_index`` says otherwise.
+
+    The log probability is computed the same way the TensorFlow greedy
+    decoder does it, as the negated sum over timesteps of the best class's
+    ``log(p + epsilon)``. This keeps ``confidence`` values identical to the
+    TF path.
+
+    Args:
+        y_pred: softmax output of shape (batch, timesteps, classes)
+        input_length: optional per-row number of valid timesteps
+        blank_index: index of the CTC blank class, defaults to classes - 1
+
+    Returns:
+        (sequences, log_probs, token_probs) where ``sequences`` is a list of
+        int64 arrays of emitted class indices per row, ``log_probs`` is a
+        float array of shape (batch,), and ``token_probs`` is a list of float
+        arrays with, for every emitted token, the highest probability it had
+        over the run of frames it was emitted from.
+    """
+    y_pred = np.asarray(y_pred, dtype=np.float32)
+    batch_size, timesteps, num_classes = y_pred.shape
+    if blank_index is None:
+        blank_index = num_classes - 1
+
+    if input_length is None:
+        lengths = np.full(batch_size, timesteps, dtype=np.int64)
+    else:
+        lengths = np.clip(np.asarray(input_length).reshape(-1).astype(np.int64), 0, timesteps)
+
+    best = np.argmax(y_pred, axis=2)
+    best_prob = np.take_along_axis(y_pred, best[:, :, np.newaxis], axis=2)[:, :, 0]
+
+    steps = np.arange(timesteps)
+    valid = steps[np.newaxis, :] < lengths[:, np.newaxis]
+
+    # TF accumulates in float32: -sum(max(log(p + eps)))
+    log_step = np.log(best_prob + np.float32(epsilon)).astype(np.float32)
+    log_probs = -np.sum(np.where(valid, log_step, np.float32(0.0)), axis=1, dtype=np.float32)
+
+    # A new run starts where the argmax changes, at the start of every row,
+    # and at the end of each row's valid length so padding never extends a run
+    previous = np.empty_like(best)
+    previous[:, 0] = -1
+    previous[:, 1:] = best[:, :-1]
+    run_start = (best != previous) | (steps[np.newaxis, :] == lengths[:, np.newaxis])
+    run_start[:, 0] = True
+
+    emit = run_start & (best != blank_index) & valid
+
+    flat_starts = np.flatnonzero(run_start.ravel())
+    run_max = np.maximum.reduceat(np.where(valid, best_prob, 0.0).ravel(), flat_starts)
+    emitted_runs = emit.ravel()[flat_starts]
+
+    tokens = best.ravel()[flat_starts][emitted_runs].astype(np.int64)
+    probs = run_max[emitted_runs].astype(np.float32)
+
+    splits = np.cumsum(emit.sum(axis=1))[:-1]
+    sequences = np.split(tokens, splits)
+    token_probs = np.split(probs, splits)
+
+    return sequences, log_probs, token_probs
+
+
+# GRID corpus sentence structure: command, color, preposition, letter, digit, adverb
+GRID_GRAMMAR = [
+    ['bin', 'lay', 'place', 'set'],
+    ['blue', 'green', 'red', 'white'],
+    ['at', 'by', 'in', 'with'],
+    [chr(c) for c in range(ord('a'), ord('z') + 1) if chr(c) != 'w'],
+    ['zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine'],
+    ['again', 'now', 'please', 'soon']
+]
+
+
+class PrefixTrie:
+    """Word-level prefix trie over class indices, used to constrain beam search
+
+    Nodes are numbered from 0 (the root). Once ``finalize`` has run, the trie is
+    held as a dense ``(num_nodes, num_classes)`` transition table where -1
+    marks a disallowed token. A beam step can then mask every candidate
+    extension with one fancy-indexing lookup.
+    """
+
+    def __init__(self, num_classes):
+        self.num_classes = num_classes
+        self._children = [{}]
+        self._terminal = [False]
+        self.transitions = None
+        self.terminal = None
+
+    def _add_node(self, terminal=False):
+        self._children.append({})
+        self._terminal.append(terminal)
+        return len(self._children) - 1
+
+    def insert(self, tokens):
+        """Add one allowed token sequence"""
+        node = 0
+        for token in tokens:
+            child = self._children[node].get(token)
+            if child is None:
+                child = self._add_node()
+                self._children[node][token] = child
+            node = child
+        self._terminal[node] = True
+
+    def finalize(self):
+        """Freeze the trie into its dense transition table"""
+        num_nodes = len(self._children)
+        self.transitions = np.full((num_nodes, self.num_classes), -1, dtype=np.int32)
+        for node, children in enumerate(self._children):
+            for token, child in children.items():
+                self.transitions[node, token] = child
+        self.terminal = np.array(self._terminal, dtype=bool)
+        return self
+
+    @property
+    def num_nodes(self):
+        return len(self._children)
+
+    @staticmethod
+    def _word_indices(classes):
+        return {str(word): i for i, word in enumerate(classes)}
+
+    @classmethod
+    def from_vocabulary(cls, classes, num_classes):
+        """Any sequence of in-vocabulary words: a single accepting node that loops on itself"""
+        trie = cls(num_classes)
+        trie._terminal[0] = True
+        for i in range(min(len(classes), num_classes)):
+            trie._children[0][i] = 0
+        return trie.finalize()
+
+    @classmethod
+    def from_sentences(cls, classes, num_classes, sentences):
+        """Only the given sentences (and their prefixes while decoding)"""
+        trie = cls(num_classes)
+        lookup = cls._word_indices(classes)
+        for sentence in sentences:
+            words = sentence.split() if isinstance(sentence, str) else list(sentence)
+            if all(word in lookup for word in words):
+                trie.insert([lookup[word] for word in words])
+        return trie.finalize()
+
+    @classmethod
+    def from_grammar(cls, classes, num_classes, grammar=GRID_GRAMMAR):
+        """Fixed slot grammar, one word per slot, shared suffixes (a chain of nodes)
+
+        Words that the label encoder does not know are left out. A slot left
+        with no known word is an error, because no sentence could match.
+        """
+        trie = cls(num_classes)
+        lookup = cls._word_indices(classes)
+        node = 0
+        for slot, words in enumerate(grammar):
+            indices = [lookup[word] for word in words if word in lookup and lookup[word] < num_classes]
+            if not indices:
+                raise ValueError(f"Grammar slot {slot} has no words in the label encoder vocabulary")
+            next_node = trie._add_node()
+            for index in indices:
+                trie._children[node][index] = next_node
+            node = next_node
+        trie._terminal[node] = True
+        return trie.finalize()
+
+
+def beam_search_ctc_decode(y_pred, beam_width=8, trie=None, input_length=None,
+                           blank_index=None, epsilon=EPSILON):
+    """CTC prefix beam search, optionally constrained by a PrefixTrie
+
+    Each step scores every (beam, class) extension at once as a
+    ``(beams, classes)`` matrix in log space. Extensions the trie does not
+    allow are masked out, and only the best ``beam_width`` extensions are
+    merged with the surviving beams. When a trie is given, beams that end on
+    a terminal node win over those that do not.
+
+    Returns:
+        (sequences, log_probs, token_probs) in the same layout as
+        ``greedy_ctc_decode``. Here ``log_probs`` are true sequence log
+        probabilities (<= 0), and ``token_probs`` is None because beam search
+        does not track per-token alignments.
+    """
+    y_pred = np.asarray(y_pred, dtype=np.float32)
+    batch_size, timesteps, num_classes = y_pred.shape
+    if blank_index is None:
+        blank_index = num_classes - 1
+
+    if input_length is None:
+        lengths = np.full(batch_size, timesteps, dtype=np.int64)
+    else:
+        lengths = np.clip(np.asarray(input_length).reshape(-1).astype(np.int64), 0, timesteps)
+
+    log_y = np.log(y_pred + np.float32(epsilon)).astype(np.float64)
+    allowed_all = np.ones(num_classes, dtype=bool)
+    allowed_all[blank_index] = False
+
+    sequences = []
+    log_probs = np.zeros(batch_size, dtype=np.float32)
+
+    for b in range(batch_size):
+        prefixes = [()]
+        p_blank = np.array([0.0])
+        p_non_blank = np.array([-np.inf])
+        nodes = np.array([0], dtype=np.int64)
+        last = np.array([-1], dtype=np.int64)
+
+        for t in range(lengths[b]):
+            lp = log_y[b, t]
+            total = np.logaddexp(p_blank, p_non_blank)
+
+            # Paths that keep the same prefix: emit blank, or repeat the last token
+            stay_blank = total + lp[blank_index]
+            stay_non_blank = p_non_blank + np.where(last >= 0, lp[np.maximum(last, 0)], -np.inf)
+
+            # Paths that append a token; a repeat of the last token needs a blank in between
+            extend = total[:, np.newaxis] + lp[np.newaxis, :]
+            repeat = np.arange(num_classes)[np.newaxis, :] == last[:, np.newaxis]
+            extend = np.where(repeat, p_blank[:, np.newaxis] + lp[np.newaxis, :], extend)
+            if trie is not None:
+                next_nodes = trie.transitions[nodes]
+                allowed = (next_nodes >= 0) & allowed_all[np.newaxis, :]
+            else:
+                allowed = np.broadcast_to(allowed_all, extend.shape)
+            extend = np.where(allowed, extend, -np.inf)
+
+            flat = extend.ravel()
+            k = min(beam_width, int(np.isfinite(flat).sum()))
+            top = np.argpartition(-flat, k - 1)[:k] if k > 0 else np.empty(0, dtype=np.int64)
+
+            candidates = {}
+            for i, prefix in enumerate(prefixes):
+                candidates[prefix] = [stay_blank[i], stay_non_blank[i], nodes[i], last[i]]
+            for j in top:
+                i, token = divmod(int(j), num_classes)
+                prefix = prefixes[i] + (token,)
+                score = flat[j]
+                entry = candidates.get(prefix)
+                if entry is None:
+                    node = next_nodes[i, token] if trie is not None else 0
+                    candidates[prefix] = [-np.inf, score, node, token]
+                else:
+                    entry[1] = np.logaddexp(entry[1], score)
+
+            ranked = sorted(candidates.items(), key=lambda item: -np.logaddexp(item[1][0], item[1][1]))[:beam_width]
+            prefixes = [prefix for prefix, _ in ranked]
+            p_blank = np.array([entry[0] for _, entry in ranked])
+            p_non_blank = np.array([entry[1] for _, entry in ranked])
+            nodes = np.array([entry[2] for _, entry in ranked], dtype=np.int64)
+            last = np.array([entry[3] for _, entry in ranked], dtype=np.int64)
+
+        scores = np.logaddexp(p_blank, p_non_blank)
+        if trie is not None and trie.terminal[nodes].any():
+            scores = np.where(trie.terminal[nodes], scores, -np.inf)
+        best = int(np.argmax(scores))
+
+        sequences.append(np.array(prefixes[best], dtype=np.int64))
+        log_probs[b] = scores[best]
+
+    return sequences, log_probs, None
+
+
+def to_dense(sequences, default_value=-1, width=None):
+    """Pad decoded sequences into a dense (batch, width) array like ctc_decode returns
+
+    ``width`` defaults to the longest sequence. Keras 3's legacy ctc_decode pads
+    to the number of timesteps instead; pass that as ``width`` to match it.
+    """
+    max_len = max((len(seq) for seq in sequences), default=0)
+    width = max_len if width is None else max(width, max_len)
+    dense = np.full((len(sequences), width), default_value, dtype=np.int64)
+    for i, seq in enumerate(sequences):
+        dense[i, :len(seq)] = seq
+    return dense
+
+
+def check_tf_parity(num_cases=200, max_batch=4, timesteps=75, num_classes=53, seed=0):
+    """Compare greedy_ctc_decode against tf.keras.backend.ctc_decode on random inputs
+
+    Covers peaked and flat distributions, long repeat runs, all-blank rows and
+    ragged input lengths. Returns a dict with the number of mismatches.
+    """
+    import tensorflow as tf
+
+    rng = np.random.default_rng(seed)
+    sequence_mismatches = 0
+    max_log_prob_error = 0.0
+
+    for case in range(num_cases):
+        batch_size = int(rng.integers(1, max_batch + 1))
+        sharpness = float(rng.choice([0.5, 2.0, 8.0]))
+        logits = rng.normal(size=(batch_size, timesteps, num_classes)) * sharpness
+
+        if case % 5 == 0:
+            # Long runs of the same class, including the blank
+            runs = rng.integers(0, num_classes, size=(batch_size, timesteps // 5))
+            logits[np.arange(batch_size)[:, None], np.arange(timesteps)[None, :], np.repeat(runs, 5, axis=1)[:, :timesteps]] += 20.0
+        if case % 17 == 0:
+            logits[..., -1] += 50.0
+
+        y_pred = np.exp(logits - logits.max(axis=2, keepdims=True))
+        y_pred = (y_pred / y_pred.sum(axis=2, keepdims=True)).astype(np.float32)
+
+        if case % 3 == 0:
+            input_length = rng.integers(1, timesteps + 1, size=batch_size)
+        else:
+            input_length = np.full(batch_size, timesteps)
+
+        decoded, tf_log_probs = tf.keras.backend.ctc_decode(y_pred, input_length=input_length, greedy=True)
+        tf_dense = decoded[0].numpy()
+        tf_log_probs = tf_log_probs.numpy().reshape(-1)
+
+        sequences, log_probs, _ = greedy_ctc_decode(y_pred, input_length=input_length)
+
+        # Compare emitted tokens only; the dense padding width depends on the Keras version
+        for row, sequence in zip(tf_dense, sequences):
+            if not np.array_equal(row[row >= 0], sequence):
+                sequence_mismatches += 1
+        max_log_prob_error = max(max_log_prob_error, float(np.max(np.abs(log_probs - tf_log_probs))))
+
+    return {
+        'cases': num_cases,
+        'sequence_mismatches': sequence_mismatches,
+        'max_log_prob_error': max_log_prob_error,
+        'passed': sequence_mismatches == 0 and max_log_prob_error < 1e-3
+    }
+
+
+if __name__ == "__main__":
+    result = check_tf_parity()
+    print(f"CTC greedy decoder parity: {result}")
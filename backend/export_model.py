@@ -0,0 +1,203 @@
+"""Convert the Keras lip-reading model to TFLite or ONNX and compare it with the original
+
+Usage (from the backend directory):
+    python export_model.py [--model PATH] [--format tflite|onnx] [--output PATH]
+                           [--quantization dynamic|float16|int8|none]
+                           [--calibration-store DIR] [--calibration-samples N]
+                           [--report] [--encoder PATH]
+
+TFLite quantization modes:
+    dynamic  - int8 weights, float activations (default, no calibration needed)
+    float16  - float16 weights
+    int8     - int8 weights and activations, calibrated on preprocessed clips
+               from a TensorStore (see precompute_tensors.py); ops without an
+               integer kernel stay float, and the model output stays float32
+    none     - plain float32 conversion
+
+Both formats take the uint8 pixel clips process_video returns: a cast and
+a 1/255 scale are put in front of the model, so normalization runs inside
+the exported graph. The TFLite graph is exported with a batch size of one
+(``TFLiteBackend`` runs batches row by row); the ONNX graph keeps an open
+batch dimension and is written by Keras' own exporter (it needs tf2onnx). Point
+LUMAVOICE_MODEL_PATH at the exported file to serve it, the backend follows
+from the extension (see inference_backends.py). ``--report`` compares it
+with the Keras model on the calibration clips (or random clips when no
+store is given): greedy transcript agreement, output difference, per-clip
+latency and peak resident memory of a process that loads only that model.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from inference_backends import PIXEL_SCALE
+from model_loader import DEFAULT_ENCODER_PATH, DEFAULT_MODEL_PATH, ModelLoader
+from tensor_store import TensorStore
+
+EXPORT_FORMATS = ('tflite', 'onnx')
+QUANTIZATION_MODES = ('dynamic', 'float16', 'int8', 'none')
+
+
+def load_calibration_clips(store_root, limit=100):
+    """Up to ``limit`` stored clips as (1, frames, height, width, 1) uint8 model inputs"""
+    with open(os.path.join(store_root, TensorStore.INDEX_FILE), 'r') as f:
+        entries = json.load(f).get('clips', {})
+    clips = []
+    for relative in sorted(entries)[:limit]:
+        clip = np.load(os.path.join(store_root, entries[relative]['file']), allow_pickle=False)
+        clips.append(TensorStore.to_model_input(clip))
+    return clips
+
+
+def _pixel_input_model(model, batch_size=None):
+    """``model`` behind a uint8 input that it casts and scales to [0, 1] itself"""
+    import tensorflow as tf
+
+    inputs = tf.keras.Input(batch_shape=(batch_size,) + tuple(model.input_shape[1:]), dtype='uint8')
+    scaled = tf.keras.layers.Rescaling(PIXEL_SCALE)(inputs)
+    return tf.keras.Model(inputs, model(scaled))
+
+
+def export_tflite(model_path, output_path, quantization='dynamic', calibration_clips=None):
+    """Convert a Keras model file to a batch-one .tflite file, returns its size in bytes"""
+    if quantization not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization: {quantization}")
+    if quantization == 'int8' and not calibration_clips:
+        raise ValueError('int8 quantization needs calibration clips (--calibration-store)')
+
+    import tensorflow as tf
+    from tensorflow.keras.models import load_model as load_keras_model
+
+    model = load_keras_model(model_path, compile=False)
+    # A static batch dimension lets the converter fuse the LSTMs into TFLite kernels
+    fixed_batch_model = _pixel_input_model(model, batch_size=1)
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(fixed_batch_model)
+    if quantization != 'none':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    if quantization == 'int8':
+        def representative_dataset():
+            for clip in calibration_clips:
+                yield [np.asarray(clip, dtype=np.uint8)]
+        converter.representative_dataset = representative_dataset
+
+    flatbuffer = converter.convert()
+    with open(output_path, 'wb') as f:
+        f.write(flatbuffer)
+    print(f"✅ Wrote {output_path} ({len(flatbuffer) / (1024 * 1024):.1f} MB, quantization: {quantization})")
+    return len(flatbuffer)
+
+
+def export_onnx(model_path, output_path):
+    """Convert a Keras model file to .onnx, returns its size in bytes"""
+    from tensorflow.keras.models import load_model as load_keras_model
+
+    model = _pixel_input_model(load_keras_model(model_path, compile=False))
+    # Keras only exports models that have been called at least once
+    model(np.zeros((1,) + tuple(model.input_shape[1:]), dtype=np.uint8))
+    model.export(output_path, format='onnx')
+    size = os.path.getsize(output_path)
+    print(f"✅ Wrote {output_path} ({size / (1024 * 1024):.1f} MB)")
+    return size
+
+
+def _peak_rss_mb(model_path, encoder_path):
+    """Peak resident memory of a fresh process that loads and warms up one model"""
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--measure-rss', model_path, '--encoder', encoder_path],
+        capture_output=True, text=True
+    )
+    lines = result.stdout.strip().splitlines()
+    try:
+        return float(lines[-1])
+    except (IndexError, ValueError):
+        return None
+
+
+def _time_clips(loader, clips, repeats):
+    outputs = [loader.model.run(clip) for clip in clips]  # Also warms up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for clip in clips:
+            loader.model.run(clip)
+    ms_per_clip = (time.perf_counter() - start) * 1000.0 / (repeats * len(clips))
+    return np.concatenate(outputs), ms_per_clip
+
+
+def parity_report(keras_path, exported_path, encoder_path, clips, repeats=3):
+    """Accuracy and latency of an exported model against the Keras one on the same clips"""
+    keras_loader = ModelLoader(model_path=keras_path, encoder_path=encoder_path)
+    exported_loader = ModelLoader(model_path=exported_path, encoder_path=encoder_path)
+    if keras_loader.model is None or exported_loader.model is None:
+        return {'error': 'Could not load both models'}
+
+    keras_out, keras_ms = _time_clips(keras_loader, clips, repeats)
+    exported_out, exported_ms = _time_clips(exported_loader, clips, repeats)
+
+    batch = np.concatenate(clips)
+    keras_text = [result.get('text') for result in keras_loader.predict_batch(batch)]
+    exported_text = [result.get('text') for result in exported_loader.predict_batch(batch)]
+
+    return {
+        'backend': exported_loader.backend,
+        'clips': len(clips),
+        'transcript_agreement': sum(a == b for a, b in zip(keras_text, exported_text)) / len(clips),
+        'frame_argmax_agreement': float(np.mean(keras_out.argmax(axis=-1) == exported_out.argmax(axis=-1))),
+        'max_abs_prob_diff': float(np.max(np.abs(keras_out - exported_out))),
+        'keras_ms_per_clip': keras_ms,
+        'exported_ms_per_clip': exported_ms,
+        'speedup': keras_ms / exported_ms if exported_ms > 0 else float('inf'),
+        'keras_file_mb': os.path.getsize(keras_path) / (1024 * 1024),
+        'exported_file_mb': os.path.getsize(exported_path) / (1024 * 1024),
+        'keras_peak_rss_mb': _peak_rss_mb(keras_path, encoder_path),
+        'exported_peak_rss_mb': _peak_rss_mb(exported_path, encoder_path)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=os.environ.get('LUMAVOICE_MODEL_PATH', DEFAULT_MODEL_PATH))
+    parser.add_argument('--encoder', default=os.environ.get('LUMAVOICE_ENCODER_PATH', DEFAULT_ENCODER_PATH))
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='tflite')
+    parser.add_argument('--output', help='Defaults to the model path with the extension of --format')
+    parser.add_argument('--quantization', choices=QUANTIZATION_MODES, default='dynamic',
+                        help='TFLite only')
+    parser.add_argument('--calibration-store', default=os.environ.get('LUMAVOICE_TENSOR_STORE_DIR'))
+    parser.add_argument('--calibration-samples', type=int, default=100)
+    parser.add_argument('--report', action='store_true', help='Compare the exported model with the Keras one')
+    parser.add_argument('--measure-rss', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure_rss:
+        ModelLoader(model_path=args.measure_rss, encoder_path=args.encoder)
+        # VmHWM is this process's own peak (ru_maxrss would include the forking parent's)
+        with open('/proc/self/status', 'r') as f:
+            peak_kb = next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+        print(peak_kb / 1024)
+        sys.exit(0)
+
+    calibration_clips = None
+    if args.calibration_store and os.path.exists(os.path.join(args.calibration_store, TensorStore.INDEX_FILE)):
+        calibration_clips = load_calibration_clips(args.calibration_store, args.calibration_samples)
+        print(f"Loaded {len(calibration_clips)} calibration clips from {args.calibration_store}")
+
+    output_path = args.output or os.path.splitext(args.model)[0] + '.' + args.format
+    if args.format == 'onnx':
+        export_onnx(args.model, output_path)
+    else:
+        export_tflite(args.model, output_path, args.quantization, calibration_clips)
+
+    if args.report:
+        clips = calibration_clips
+        if not clips:
+            print("⚠️ No calibration store, comparing on random clips (transcripts are not meaningful)")
+            rng = np.random.default_rng(0)
+            shape = (1,) + tuple(ModelLoader(model_path=args.model, encoder_path=args.encoder).model.input_shape[1:])
+            clips = [rng.integers(0, 256, shape, dtype=np.uint8) for _ in range(8)]
+        print(f"Parity report: {parity_report(args.model, output_path, args.encoder, clips)}")
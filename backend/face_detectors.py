@@ -0,0 +1,65 @@
+import threading
+
+import cv2
+
+# Face detector backends VideoPreprocessor can use to seed landmark regression:
+#   'sfd'       - face_alignment's default S3FD detector, most accurate, heaviest on CPU
+#   'blazeface' - face_alignment's BlazeFace detector, much lighter, made for frontal faces
+#   'haar'      - OpenCV Haar cascade box, then face_alignment landmark regression
+#   'cached'    - SFD once, then regression seeded with the previous frame's face box,
+#                 with SFD again only when the new landmarks drift off that box
+FACE_DETECTORS = ('sfd', 'blazeface', 'haar', 'cached')
+
+
+def box_iou(a, b):
+    """Intersection over union of two (x1, y1, x2, y2) boxes"""
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class HaarFaceDetector:
+    """Largest frontal face from OpenCV's Haar cascade, as an (x1, y1, x2, y2) box
+
+    Detection runs on a copy of the frame downscaled to ``detect_width``,
+    which is plenty for one face filling a good part of the frame.
+    """
+
+    def __init__(self, cascade_path=None, detect_width=320, scale_factor=1.1, min_neighbors=5, min_size_ratio=0.15):
+        self.cascade_path = cascade_path or cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        self.detect_width = detect_width
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size_ratio = min_size_ratio
+        # CascadeClassifier is not safe to share between threads
+        self._local = threading.local()
+
+    def _classifier(self):
+        classifier = getattr(self._local, 'classifier', None)
+        if classifier is None:
+            classifier = cv2.CascadeClassifier(self.cascade_path)
+            if classifier.empty():
+                raise RuntimeError(f"Could not load Haar cascade from {self.cascade_path}")
+            self._local.classifier = classifier
+        return classifier
+
+    def detect(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        scale = min(1.0, self.detect_width / gray.shape[1])
+        if scale < 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        min_side = int(min(gray.shape[:2]) * self.min_size_ratio)
+        faces = self._classifier().detectMultiScale(
+            gray,
+            scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors,
+            minSize=(min_side, min_side)
+        )
+        if len(faces) == 0:
+            return None
+
+        x, y, w, h = max(faces, key=lambda face: face[2] * face[3])
+        return (x / scale, y / scale, (x + w) / scale, (y + h) / scale)
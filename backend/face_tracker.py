@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from face_detectors import box_iou
+
+
+class FaceTracker:
+    """Per-session face landmarks for frame-rate callers such as the live overlay
+
+    For each session id the last face box is kept. The next frame of that
+    session runs landmark regression only, seeded with that box, which skips
+    the face detector. The new landmarks must still overlap the previous box
+    (``min_iou``); if they do not, or regression fails, tracking is lost and
+    full detection runs. Calls without a session id always run full detection.
+
+    Sessions expire after ``ttl_seconds`` without a frame, and at most
+    ``max_sessions`` are kept (least recently used dropped first).
+    """
+
+    def __init__(self, preprocessor, max_sessions=256, ttl_seconds=300, min_iou=0.3):
+        self.preprocessor = preprocessor
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.min_iou = min_iou
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'detections': 0, 'tracked': 0, 'lost': 0}
+
+    def _get_box(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            if now - entry['seen'] > self.ttl_seconds:
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return entry['box']
+
+    def _set_box(self, session_id, box):
+        with self._lock:
+            if box is None:
+                self._sessions.pop(session_id, None)
+                return
+            self._sessions[session_id] = {'box': box, 'seen': time.monotonic()}
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def detect(self, frame, session_id=None):
+        """Landmarks and mouth crop for one BGR frame
+
+        Returns a dict with ``landmarks`` ((68, 2) array or None), ``crop``
+        ((y1, y2, x1, x2), the same as ``VideoPreprocessor.measurements``) and
+        ``tracked`` (whether detection was skipped).
+        """
+        preprocessor = self.preprocessor
+        landmarks = None
+        tracked = False
+
+        previous_box = self._get_box(session_id) if session_id else None
+        if previous_box is not None:
+            landmarks = preprocessor._regress_landmarks(frame, previous_box)
+            if landmarks is not None:
+                box = preprocessor._face_box_from_landmarks(landmarks, frame.shape)
+                tracked = box_iou(previous_box, box) >= self.min_iou
+            if tracked:
+                self._count('tracked')
+            else:
+                self._count('lost')
+                landmarks = None
+
+        if landmarks is None:
+            landmarks = preprocessor._detect_landmarks(frame)
+            self._count('detections')
+
+        if landmarks is None:
+            if session_id:
+                self._set_box(session_id, None)
+            return {'landmarks': None, 'crop': preprocessor._default_crop(frame.shape), 'tracked': False}
+
+        if session_id:
+            self._set_box(session_id, preprocessor._face_box_from_landmarks(landmarks, frame.shape))
+        try:
+            crop = preprocessor._crop_from_landmarks(landmarks, frame.shape)
+        except Exception as e:
+            print(f"Error in measurements: {e}")
+            crop = preprocessor._default_crop(frame.shape)
+        return {'landmarks': np.asarray(landmarks), 'crop': crop, 'tracked': tracked}
+
+    def end_session(self, session_id):
+        self._set_box(session_id, None)
+
+    def get_stats(self):
+        """Counters, plus the share of frames that skipped detection and of tracking attempts that were lost"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['sessions'] = len(self._sessions)
+        frames = stats['tracked'] + stats['detections']
+        attempts = stats['tracked'] + stats['lost']
+        stats['frames'] = frames
+        stats['tracked_rate'] = stats['tracked'] / frames if frames else 0.0
+        stats['detection_rate'] = stats['detections'] / frames if frames else 0.0
+        stats['lost_rate'] = stats['lost'] / attempts if attempts else 0.0
+        return stats
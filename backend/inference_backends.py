@@ -0,0 +1,262 @@
+import logging
+import os
+import threading
+
+import numpy as np
+
+# Runtimes ModelLoader can run a model on:
+#   'keras'  - .h5/.keras files through TensorFlow, traced into a tf.function
+#   'onnx'   - .onnx files through ONNX Runtime, TensorFlow is never imported
+#   'tflite' - .tflite files from export_model.py through the TFLite interpreter (XNNPACK on CPU)
+INFERENCE_BACKENDS = ('keras', 'onnx', 'tflite')
+
+ONNX_GRAPH_OPTIMIZATIONS = ('disable', 'basic', 'extended', 'all')
+
+# Clips travel as uint8 pixels (see VideoPreprocessor.process_video); the
+# models were trained on pixels scaled to [0, 1]
+PIXEL_SCALE = 1.0 / 255.0
+
+
+def to_float_input(input_data):
+    """The cast/scale in front of a float model: uint8 pixels -> float32 in [0, 1]
+
+    Float input is taken as already normalized and passed through.
+    """
+    input_data = np.asarray(input_data)
+    if input_data.dtype == np.uint8:
+        return np.multiply(input_data, np.float32(PIXEL_SCALE), dtype=np.float32)
+    return np.asarray(input_data, dtype=np.float32)
+
+
+def to_pixel_input(input_data):
+    """The reverse, for graphs that normalize their own input: floats in [0, 1] -> uint8 pixels
+
+    uint8 input is passed through.
+    """
+    input_data = np.asarray(input_data)
+    if input_data.dtype == np.uint8:
+        return input_data
+    return np.clip(np.rint(input_data * 255.0), 0, 255).astype(np.uint8)
+
+
+def backend_for_path(model_path):
+    """The backend a model file is meant for, by its extension"""
+    extension = os.path.splitext(model_path)[1].lower()
+    if extension == '.onnx':
+        return 'onnx'
+    if extension == '.tflite':
+        return 'tflite'
+    return 'keras'
+
+
+def create_backend(name, model_path, **options):
+    """Load ``model_path`` on backend ``name`` ('auto' picks it from the extension)
+
+    ``options`` are that backend's session options, see each class.
+    """
+    if name == 'auto':
+        name = backend_for_path(model_path)
+    if name not in BACKEND_CLASSES:
+        raise ValueError(f"Unknown inference backend: {name}")
+    return BACKEND_CLASSES[name](model_path, **options)
+
+
+class KerasBackend:
+    """A Keras model called through a traced, fixed-signature tf.function
+
+    Calling the model directly through a tf.function skips the data adapter
+    and callback setup that Keras ``model.predict`` does on every call. The
+    batch dimension is left open so micro-batches of any size reuse the same
+    concrete function. uint8 clips are cast and scaled inside the traced
+    graph; float clips (already in [0, 1]) get a function of their own.
+
+    Session options:
+        intra_op_threads / inter_op_threads - TensorFlow thread pool sizes (0 keeps
+            TensorFlow's default); they only apply if TensorFlow has not run anything yet
+        jit_compile - compile the traced function with XLA
+    """
+
+    name = 'keras'
+
+    def __init__(self, model_path, intra_op_threads=0, inter_op_threads=0, jit_compile=False):
+        import tensorflow as tf
+        from tensorflow.keras.models import load_model as load_keras_model
+
+        try:
+            if intra_op_threads:
+                tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+            if inter_op_threads:
+                tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+        except RuntimeError as e:
+            logging.warning(f"TensorFlow thread settings ignored, the runtime is already initialized: {e}")
+
+        self.model = load_keras_model(model_path)
+        self.input_shape = self.model.input_shape
+        self.output_shape = self.model.output_shape
+        self._infer_fns = {}
+
+        if isinstance(self.input_shape, list):
+            logging.warning("Model has multiple inputs, falling back to model.predict")
+            return
+
+        model = self.model
+        shape = (None,) + tuple(self.input_shape[1:])
+
+        def trace(dtype):
+            @tf.function(input_signature=[tf.TensorSpec(shape=shape, dtype=dtype)], jit_compile=bool(jit_compile))
+            def infer(x):
+                if dtype == tf.uint8:
+                    x = tf.cast(x, tf.float32) * PIXEL_SCALE
+                return model(x, training=False)
+            return infer
+
+        self._infer_fns = {np.dtype(np.uint8): trace(tf.uint8), np.dtype(np.float32): trace(tf.float32)}
+
+    @property
+    def compiled(self):
+        return bool(self._infer_fns)
+
+    def run(self, input_data):
+        input_data = np.asarray(input_data)
+        if not self._infer_fns:
+            return self.model.predict(to_float_input(input_data), verbose=0)
+        if input_data.dtype != np.uint8:
+            input_data = input_data.astype(np.float32, copy=False)
+        return self._infer_fns[input_data.dtype](input_data).numpy()
+
+    def count_params(self):
+        return self.model.count_params()
+
+    def summary(self):
+        lines = []
+        self.model.summary(print_fn=lambda line, *args, **kwargs: lines.append(line))
+        return '\n'.join(lines)
+
+
+class OnnxBackend:
+    """An ONNX model on ONNX Runtime
+
+    Keras 3 writes one with ``model.export(path, format='onnx')``, see
+    export_model.py. Graphs exported from there take uint8 pixels and
+    normalize them themselves; for older float-input graphs the pixels are
+    scaled with ``to_float_input`` first.
+
+    Session options:
+        intra_op_threads / inter_op_threads - ONNX Runtime thread pool sizes (0 keeps its default)
+        graph_optimization - 'disable', 'basic', 'extended' or 'all'
+        providers - execution providers in order of preference, CPU by default
+    """
+
+    name = 'onnx'
+    compiled = True
+
+    def __init__(self, model_path, intra_op_threads=0, inter_op_threads=0, graph_optimization='all',
+                 providers=None):
+        import onnxruntime as ort
+
+        if graph_optimization not in ONNX_GRAPH_OPTIMIZATIONS:
+            raise ValueError(f"Unknown graph_optimization: {graph_optimization}")
+        session_options = ort.SessionOptions()
+        session_options.intra_op_num_threads = int(intra_op_threads or 0)
+        session_options.inter_op_num_threads = int(inter_op_threads or 0)
+        session_options.graph_optimization_level = {
+            'disable': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        }[graph_optimization]
+
+        self.model_path = model_path
+        self.session = ort.InferenceSession(
+            model_path,
+            sess_options=session_options,
+            providers=providers or ['CPUExecutionProvider']
+        )
+        self._input = self.session.get_inputs()[0]
+        self._output = self.session.get_outputs()[0]
+        # Symbolic dimensions (the batch, and any the exporter left open) become None like in Keras
+        self.input_shape = tuple(dim if isinstance(dim, int) else None for dim in self._input.shape)
+        self.output_shape = tuple(dim if isinstance(dim, int) else None for dim in self._output.shape)
+        self.pixel_input = self._input.type == 'tensor(uint8)'
+
+    def run(self, input_data):
+        input_data = to_pixel_input(input_data) if self.pixel_input else to_float_input(input_data)
+        return self.session.run([self._output.name], {self._input.name: input_data})[0]
+
+    def count_params(self):
+        # Initializer sizes are not exposed by the runtime
+        return None
+
+    def summary(self):
+        size_mb = os.path.getsize(self.model_path) / (1024 * 1024)
+        providers = ', '.join(self.session.get_providers())
+        return (f"ONNX model {self.model_path} ({size_mb:.1f} MB) on {providers}: "
+                f"input {self.input_shape}, output {self.output_shape}")
+
+
+def _tflite_interpreter_class():
+    """The lightest TFLite interpreter available; the standalone runtimes do not need TensorFlow"""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteBackend:
+    """A .tflite model from export_model.py on the TFLite interpreter
+
+    Float and dynamic-range models run through the XNNPACK delegate, which
+    the interpreter applies by default on CPU. The exported graph has a
+    fixed batch size of one, because XNNPACK cannot resize the unrolled
+    LSTM, so a batch runs row by row. The interpreter is not thread-safe,
+    so invocations are serialized. Like ONNX graphs, exported models take
+    uint8 pixels; float-input ones get them scaled first.
+
+    Session options:
+        num_threads - interpreter (and XNNPACK) threads, 0 keeps the runtime default
+    """
+
+    name = 'tflite'
+    compiled = True
+
+    def __init__(self, model_path, num_threads=0):
+        self.model_path = model_path
+        self.interpreter = _tflite_interpreter_class()(model_path=model_path, num_threads=num_threads or None)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self.input_shape = (None,) + tuple(int(dim) for dim in self._input['shape'][1:])
+        self.output_shape = (None,) + tuple(int(dim) for dim in self._output['shape'][1:])
+        self.pixel_input = self._input['dtype'] == np.uint8
+        self._lock = threading.Lock()
+
+    def run(self, input_data):
+        input_data = to_pixel_input(input_data) if self.pixel_input else to_float_input(input_data)
+        outputs = np.empty((len(input_data),) + self.output_shape[1:], dtype=np.float32)
+        with self._lock:
+            for i in range(len(input_data)):
+                self.interpreter.set_tensor(self._input['index'], input_data[i:i + 1])
+                self.interpreter.invoke()
+                outputs[i] = self.interpreter.get_tensor(self._output['index'])[0]
+        return outputs
+
+    def count_params(self):
+        # Weights are not separable from other tensors here
+        return None
+
+    def summary(self):
+        size_mb = os.path.getsize(self.model_path) / (1024 * 1024)
+        return (f"TFLite model {self.model_path} ({size_mb:.1f} MB): "
+                f"input {self.input_shape}, output {self.output_shape}")
+
+
+BACKEND_CLASSES = {
+    'keras': KerasBackend,
+    'onnx': OnnxBackend,
+    'tflite': TFLiteBackend
+}
@@ -0,0 +1,81 @@
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class QueueFullError(Exception):
+    """Raised when the inference stage has no room for another request"""
+
+
+class InferenceExecutor:
+    """Runs preprocessing and model inference off the asyncio event loop.
+
+    Preprocessing (face alignment, OpenCV) and TensorFlow inference get their
+    own thread pools so a slow landmark pass never starves the model and vice
+    versa. Admission is bounded by ``max_queue_depth``: once that many requests
+    are in flight (running or waiting for a worker) new ones are rejected with
+    ``QueueFullError`` instead of piling up.
+    """
+
+    def __init__(self, preprocess_workers=2, inference_workers=1, max_queue_depth=8):
+        self.preprocess_workers = preprocess_workers
+        self.inference_workers = inference_workers
+        self.max_queue_depth = max_queue_depth
+
+        self.preprocess_pool = ThreadPoolExecutor(
+            max_workers=preprocess_workers, thread_name_prefix='preprocess'
+        )
+        self.inference_pool = ThreadPoolExecutor(
+            max_workers=inference_workers, thread_name_prefix='inference'
+        )
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rejected = 0
+        self._completed = 0
+
+    @contextmanager
+    def slot(self):
+        """Reserve a place in the queue for the duration of one request"""
+        with self._lock:
+            if self._in_flight >= self.max_queue_depth:
+                self._rejected += 1
+                raise QueueFullError(
+                    f"Inference queue is full ({self._in_flight}/{self.max_queue_depth} requests in flight)"
+                )
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._completed += 1
+
+    async def preprocess(self, fn, *args, **kwargs):
+        """Run a preprocessing callable on the preprocessing pool"""
+        return await self._run(self.preprocess_pool, fn, *args, **kwargs)
+
+    async def _run(self, pool, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool, functools.partial(fn, *args, **kwargs))
+
+    def get_stats(self):
+        """Get current queue occupancy and counters"""
+        with self._lock:
+            return {
+                'in_flight': self._in_flight,
+                'max_queue_depth': self.max_queue_depth,
+                'preprocess_workers': self.preprocess_workers,
+                'inference_workers': self.inference_workers,
+                'completed': self._completed,
+                'rejected': self._rejected
+            }
+
+    def shutdown(self, wait=True):
+        """Stop both worker pools"""
+        logging.info("Shutting down inference executor pools")
+        self.preprocess_pool.shutdown(wait=wait)
+        self.inference_pool.shutdown(wait=wait)
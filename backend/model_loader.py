@@ -1,27 +1,86 @@
+import hashlib
 import os
 import pickle
 import numpy as np
-import tensorflow as tf
-from tensorflow.keras.models import load_model
+from ctc_decoder import greedy_ctc_decode, beam_search_ctc_decode, PrefixTrie, GRID_GRAMMAR
+from inference_backends import backend_for_path, create_backend
 import logging
+import threading
+import time
+
+DEFAULT_MODEL_PATH = '/home/poras9868/predict_model.h5'
+DEFAULT_ENCODER_PATH = '/home/poras9868/label_encoder.pkl'
+
 
 class ModelLoader:
-    def __init__(self):
-        self.model = None
+    def __init__(self, warmup_batch_sizes=(1,), beam_width=8, model_path=None, encoder_path=None, load=True,
+                 backend='auto', backend_options=None):
+        """
+        With ``load=False`` nothing heavy happens here (TensorFlow is not even
+        imported); call ``load_model`` or ``load_in_background`` later, or let
+        the first prediction load it.
+
+        backend:
+            runtime for the model, one of ``inference_backends.INFERENCE_BACKENDS``
+            ('keras', 'onnx', 'tflite'), or 'auto' to pick it from the file extension
+
+        backend_options:
+            session options per backend name, e.g. ``{'onnx': {'intra_op_threads': 4}}``;
+            only the entry for the backend in use applies
+        """
+        self.model = None  # An inference_backends backend once loaded
         self.label_encoder = None
-        self.model_path = '/home/poras9868/predict_model.h5'
-        self.encoder_path = '/home/poras9868/label_encoder.pkl'
+        self.model_path = model_path or DEFAULT_MODEL_PATH
+        self.encoder_path = encoder_path or DEFAULT_ENCODER_PATH
+        self.load_state = 'not_loaded'  # 'not_loaded', 'loading', 'ready' or 'failed'
+        self._load_lock = threading.Lock()
+        self.warmup_batch_sizes = tuple(warmup_batch_sizes)
+        self.beam_width = beam_width
+        self.backend = backend_for_path(self.model_path) if backend == 'auto' else backend
+        self.backend_options = backend_options or {}
+        self.tries = {}
+        self.model_version = None
+        self._timing_lock = threading.Lock()
+        self.timing_stats = {
+            'calls': 0,
+            'total_ms': 0.0,
+            'last_ms': 0.0,
+            'max_ms': 0.0,
+            'warmup_ms': {}
+        }
+        if load:
+            self.load_model()
+
+    def ensure_loaded(self):
+        """Load the model unless that already happened or is in progress elsewhere (then wait for it)"""
+        if self.load_state in ('ready', 'failed'):
+            return
         self.load_model()
-        
+
+    def load_in_background(self):
+        """Load and warm up the model on a daemon thread, returns the thread"""
+        thread = threading.Thread(target=self.ensure_loaded, name='model-loader', daemon=True)
+        thread.start()
+        return thread
+
     def load_model(self):
         """Load the trained model and label encoder"""
+        with self._load_lock:
+            if self.load_state == 'ready':
+                return
+            self.load_state = 'loading'
+            self._load_model()
+            self.load_state = 'ready' if self.model is not None else 'failed'
+
+    def _load_model(self):
         try:
-            # Load the Keras model
+            # Load the model on the configured inference backend
             if os.path.exists(self.model_path):
-                self.model = load_model(self.model_path)
-                logging.info(f"Model loaded successfully from {self.model_path}")
+                self.model = create_backend(self.backend, self.model_path, **self.backend_options.get(self.backend, {}))
+                logging.info(f"Model loaded successfully from {self.model_path} ({self.backend} backend)")
                 logging.info(f"Model input shape: {self.model.input_shape}")
                 logging.info(f"Model output shape: {self.model.output_shape}")
+                self.warmup()
             else:
                 logging.warning(f"Model file {self.model_path} not found")
                 
@@ -35,32 +94,124 @@ class ModelLoader:
                     logging.info(f"Sample classes: {self.label_encoder.classes_[:10]}")
             else:
                 logging.warning(f"Encoder file {self.encoder_path} not found")
+
+            if self.model is not None and self.label_encoder is not None:
+                self._build_decoding_tries()
+
+            if self.model is not None:
+                self.model_version = self._compute_model_version()
+                logging.info(f"Model version: {self.model_version}")
                 
         except Exception as e:
             logging.error(f"Error loading model or encoder: {str(e)}")
             self.model = None
             self.label_encoder = None
+            self.tries = {}
+            self.model_version = None
+
+    def _compute_model_version(self):
+        """Content hash of the model and encoder files, so cached results follow the weights"""
+        digest = hashlib.sha256()
+        for path in (self.model_path, self.encoder_path):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+        return digest.hexdigest()[:16]
+
+    def _build_decoding_tries(self):
+        """Precompute the prefix tries that constrain beam-search decoding"""
+        classes = getattr(self.label_encoder, 'classes_', None)
+        if classes is None or len(self.model.output_shape) != 3:
+            return
+
+        num_classes = self.model.output_shape[-1]
+        self.tries = {'vocabulary': PrefixTrie.from_vocabulary(classes, num_classes)}
+        try:
+            self.tries['grid'] = PrefixTrie.from_grammar(classes, num_classes, GRID_GRAMMAR)
+        except ValueError as e:
+            logging.warning(f"GRID grammar not available for this vocabulary: {e}")
+        logging.info(f"Beam-search tries ready: {sorted(self.tries)}")
+
+    def warmup(self, batch_sizes=None):
+        """Run dummy batches through the model so the first request is not slow"""
+        if self.model is None:
+            return {}
+
+        batch_sizes = batch_sizes or self.warmup_batch_sizes
+        for batch_size in batch_sizes:
+            # uint8 like real clips, so this warms the path requests take
+            dummy = np.zeros((batch_size,) + tuple(self.model.input_shape[1:]), dtype=np.uint8)
+            start = time.perf_counter()
+            self.model.run(dummy)
+            elapsed_ms = (time.perf_counter() - start) * 1000.0
+            with self._timing_lock:
+                self.timing_stats['warmup_ms'][int(batch_size)] = elapsed_ms
+            logging.info(f"Warm-up with batch size {batch_size} took {elapsed_ms:.1f} ms")
+
+        return dict(self.timing_stats['warmup_ms'])
+
+    def _forward(self, input_data):
+        """Run the model on a batch and record how long it took"""
+        start = time.perf_counter()
+        predictions = self.model.run(input_data)
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+
+        with self._timing_lock:
+            stats = self.timing_stats
+            stats['calls'] += 1
+            stats['total_ms'] += elapsed_ms
+            stats['last_ms'] = elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+
+        return predictions, elapsed_ms
+
+    def get_timing_stats(self):
+        """Get per-call inference timings"""
+        with self._timing_lock:
+            stats = dict(self.timing_stats)
+            stats['warmup_ms'] = dict(stats['warmup_ms'])
+        stats['average_ms'] = stats['total_ms'] / stats['calls'] if stats['calls'] else 0.0
+        return stats
     
-    def predict(self, processed_frames, debug=False):
+    def predict(self, processed_frames, debug=False, decode_options=None):
         """Make prediction on processed video frames using CTC decoding"""
+        return self.predict_batch(processed_frames, debug, decode_options)[0]
+
+    def predict_batch(self, processed_frames, debug=False, decode_options=None):
+        """Run a single forward pass over a batch of clips and decode every row
+
+        ``decode_options`` is either one dict applied to every row or a list
+        with one dict per row. Recognised keys are ``mode`` ('greedy' or
+        'beam'), ``beam_width``, and ``grammar`` (a key of ``self.tries``).
+        Clips are uint8 pixels as process_video returns them (float clips in
+        [0, 1] work too); the backend normalizes them.
+        Returns one result dict per clip, in input order.
+        """
+        batch_size = max(len(processed_frames), 1)
+
+        self.ensure_loaded()
         if self.model is None:
-            return {
+            return [{
                 'error': 'Model not loaded',
                 'text': '',
                 'confidence': 0.0
-            }
+            } for _ in range(batch_size)]
         
         try:
             # Ensure input has correct shape
             input_data = np.array(processed_frames)
+            batch_size = input_data.shape[0]
             if debug:
                 logging.info(f"Input shape: {input_data.shape}")
-                logging.info(f"Input range: [{input_data.min():.3f}, {input_data.max():.3f}]")
+                logging.info(f"Input range: [{input_data.min()}, {input_data.max()}] ({input_data.dtype})")
             
             # Make prediction
-            predictions = self.model.predict(input_data, verbose=0)
+            predictions, inference_ms = self._forward(input_data)
             
             if debug:
+                logging.info(f"Inference took {inference_ms:.1f} ms for batch of {batch_size}")
                 logging.info(f"Raw prediction shape: {predictions.shape}")
                 logging.info(f"Raw prediction range: [{predictions.min():.6f}, {predictions.max():.6f}]")
                 logging.info(f"Raw prediction sample (first 5 timesteps, first 10 classes):")
@@ -68,31 +219,36 @@ class ModelLoader:
             
             # Check if this is a CTC model (3D output: batch, timesteps, classes)
             if len(predictions.shape) == 3:
-                return self._decode_ctc_predictions(predictions, debug)
+                results = self._decode_ctc_predictions(predictions, debug, decode_options)
             
             # Handle 2D classification output (fallback)
             elif len(predictions.shape) == 2:
-                return self._decode_classification_predictions(predictions, debug)
+                results = self._decode_classification_predictions(predictions, debug)
             
             else:
-                return {
+                results = [{
                     'text': 'Unsupported model output format',
                     'confidence': 0.0,
-                    'raw_output': predictions.tolist()
-                }
+                    'raw_output': row.tolist()
+                } for row in predictions]
+
+            for result in results:
+                result['inference_ms'] = inference_ms
+                result['batch_size'] = batch_size
+            return results
                 
         except Exception as e:
             logging.error(f"Prediction error: {str(e)}")
-            return {
+            return [{
                 'error': f'Prediction failed: {str(e)}',
                 'text': '',
                 'confidence': 0.0
-            }
+            } for _ in range(batch_size)]
     
-    def _decode_ctc_predictions(self, predictions, debug=False):
-        """Decode CTC predictions to text"""
+    def _decode_ctc_predictions(self, predictions, debug=False, decode_options=None):
+        """Decode CTC predictions to text, one result per batch row"""
+        batch_size = predictions.shape[0]
         try:
-            batch_size = predictions.shape[0]
             sequence_length = predictions.shape[1]
             
             if debug:
@@ -105,80 +261,128 @@ class ModelLoader:
                         class_name = self.label_encoder.classes_[cls]
                         logging.info(f"  Class {cls} ('{class_name}'): {count} timesteps")
             
-            # CTC decode using TensorFlow backend
-            decoded, log_probs = tf.keras.backend.ctc_decode(
-                predictions,
-                input_length=np.ones(batch_size) * sequence_length,
-                greedy=True
-            )
-            
-            # Extract sequence for first (and likely only) batch item
-            sequence = decoded[0].numpy()[0]
-            log_prob = log_probs.numpy()[0]
-            
-            if debug:
-                logging.info(f"CTC decoded sequence: {sequence}")
-                logging.info(f"CTC log probability: {log_prob}")
-            
-            # Filter out blank tokens (typically -1 or a specific blank class)
-            valid_indices = sequence[sequence >= 0]
-            
-            if len(valid_indices) == 0:
-                return {
-                    'text': '',
-                    'confidence': 0.0,
-                    'decoded_sequence': sequence.tolist(),
-                    'log_probability': float(log_prob)
-                }
-            
-            # Convert indices to words using label encoder
-            words = []
-            for idx in valid_indices:
-                try:
-                    if idx < len(self.label_encoder.classes_):
-                        word = self.label_encoder.classes_[idx]
-                        words.append(word)
-                        if debug:
-                            logging.info(f"Index {idx} -> '{word}'")
-                    else:
-                        if debug:
-                            logging.warning(f"Index {idx} out of range (max: {len(self.label_encoder.classes_)})")
-                except Exception as e:
-                    if debug:
-                        logging.error(f"Error converting index {idx}: {e}")
+            row_options = self._row_decode_options(decode_options, batch_size)
+            results = [None] * batch_size
+            
+            # Greedy rows are decoded together in one vectorized NumPy call
+            # (argmax, merge repeats, drop blanks)
+            greedy_rows = [i for i, options in enumerate(row_options) if options['mode'] != 'beam']
+            if greedy_rows:
+                sequences, log_probs, token_probs = greedy_ctc_decode(
+                    predictions[greedy_rows],
+                    input_length=np.full(len(greedy_rows), sequence_length)
+                )
+                for j, i in enumerate(greedy_rows):
+                    results[i] = self._build_ctc_result(sequences[j], log_probs[j], debug, token_probs[j])
+                    results[i]['decode_mode'] = 'greedy'
+            
+            # Beam rows are searched one by one, each with its own width and grammar
+            for i, options in enumerate(row_options):
+                if options['mode'] != 'beam':
                     continue
-            
-            predicted_text = ' '.join(words) if words else ''
-            
-            # Calculate confidence from log probability
-            # Convert log probability to a more interpretable confidence score
-            confidence = float(np.exp(log_prob)) if log_prob > -100 else 0.0
-            confidence = min(max(confidence, 0.0), 1.0)  # Clamp to [0, 1]
-            
-            result = {
-                'text': predicted_text,
-                'confidence': confidence,
-                'decoded_sequence': sequence.tolist(),
-                'valid_indices': valid_indices.tolist(),
-                'words': words,
-                'log_probability': float(log_prob)
-            }
-            
-            if debug:
-                logging.info(f"Final result: {result}")
-            
-            return result
+                trie = self.tries.get(options['grammar'])
+                sequences, log_probs, _ = beam_search_ctc_decode(
+                    predictions[i:i + 1],
+                    beam_width=options['beam_width'],
+                    trie=trie
+                )
+                results[i] = self._build_ctc_result(sequences[0], log_probs[0], debug)
+                results[i]['decode_mode'] = 'beam'
+                results[i]['beam_width'] = options['beam_width']
+                results[i]['grammar'] = options['grammar'] if trie is not None else None
+            
+            return results
             
         except Exception as e:
             logging.error(f"CTC decoding error: {str(e)}")
-            return {
+            return [{
                 'error': f'CTC decoding failed: {str(e)}',
                 'text': '',
                 'confidence': 0.0
+            } for _ in range(batch_size)]
+
+    def _row_decode_options(self, decode_options, batch_size):
+        """Expand per-request decode options into one complete dict per row"""
+        if decode_options is None or isinstance(decode_options, dict):
+            decode_options = [decode_options] * batch_size
+
+        rows = []
+        for options in decode_options:
+            options = options or {}
+            rows.append({
+                'mode': options.get('mode') or 'greedy',
+                'beam_width': int(options.get('beam_width') or self.beam_width),
+                'grammar': options.get('grammar') or 'vocabulary'
+            })
+        return rows
+
+    def _build_ctc_result(self, sequence, log_prob, debug=False, token_probs=None):
+        """Turn one decoded CTC sequence into a prediction result"""
+        log_prob = np.asarray(log_prob).reshape(-1)[0]
+        
+        if debug:
+            logging.info(f"CTC decoded sequence: {sequence}")
+            logging.info(f"CTC log probability: {log_prob}")
+        
+        # Filter out blank tokens (typically -1 or a specific blank class)
+        valid_indices = sequence[sequence >= 0]
+        
+        if len(valid_indices) == 0:
+            return {
+                'text': '',
+                'confidence': 0.0,
+                'decoded_sequence': sequence.tolist(),
+                'log_probability': float(log_prob)
             }
+        
+        # Convert indices to words using label encoder
+        words = []
+        word_probabilities = []
+        for position, idx in enumerate(sequence):
+            if idx < 0:
+                continue
+            try:
+                if idx < len(self.label_encoder.classes_):
+                    word = self.label_encoder.classes_[idx]
+                    words.append(word)
+                    if token_probs is not None:
+                        word_probabilities.append(float(token_probs[position]))
+                    if debug:
+                        logging.info(f"Index {idx} -> '{word}'")
+                else:
+                    if debug:
+                        logging.warning(f"Index {idx} out of range (max: {len(self.label_encoder.classes_)})")
+            except Exception as e:
+                if debug:
+                    logging.error(f"Error converting index {idx}: {e}")
+                continue
+        
+        predicted_text = ' '.join(words) if words else ''
+        
+        # Calculate confidence from log probability
+        # Convert log probability to a more interpretable confidence score
+        # (the greedy decoder's value is a negated sum and can be large and positive)
+        confidence = float(np.exp(min(log_prob, 0.0))) if log_prob > -100 else 0.0
+        confidence = min(max(confidence, 0.0), 1.0)  # Clamp to [0, 1]
+        
+        result = {
+            'text': predicted_text,
+            'confidence': confidence,
+            'decoded_sequence': sequence.tolist(),
+            'valid_indices': valid_indices.tolist(),
+            'words': words,
+            'log_probability': float(log_prob)
+        }
+        if token_probs is not None:
+            result['word_probabilities'] = word_probabilities
+        
+        if debug:
+            logging.info(f"Final result: {result}")
+        
+        return result
     
     def _decode_classification_predictions(self, predictions, debug=False):
-        """Decode classification predictions (fallback method)"""
+        """Decode classification predictions (fallback method), one result per batch row"""
         try:
             predicted_class_idx = np.argmax(predictions, axis=1)
             confidence = np.max(predictions, axis=1)
@@ -187,31 +391,34 @@ class ModelLoader:
                 logging.info(f"Classification - predicted indices: {predicted_class_idx}")
                 logging.info(f"Classification - confidences: {confidence}")
             
-            # Decode predictions using label encoder
-            if self.label_encoder and hasattr(self.label_encoder, 'classes_'):
-                try:
-                    predicted_text = self.label_encoder.inverse_transform(predicted_class_idx)
-                    text = ' '.join(predicted_text)
-                except Exception as e:
-                    logging.error(f"Error in inverse transform: {e}")
-                    text = f"Class_{predicted_class_idx[0]}"
-            else:
-                text = f"Class_{predicted_class_idx[0]}"
+            results = []
+            for idx, conf in zip(predicted_class_idx, confidence):
+                # Decode predictions using label encoder
+                if self.label_encoder and hasattr(self.label_encoder, 'classes_'):
+                    try:
+                        text = ' '.join(self.label_encoder.inverse_transform([idx]))
+                    except Exception as e:
+                        logging.error(f"Error in inverse transform: {e}")
+                        text = f"Class_{idx}"
+                else:
+                    text = f"Class_{idx}"
+                
+                results.append({
+                    'text': text,
+                    'confidence': float(conf),
+                    'predicted_indices': [int(idx)],
+                    'frame_confidences': [float(conf)]
+                })
             
-            return {
-                'text': text,
-                'confidence': float(np.mean(confidence)),
-                'predicted_indices': predicted_class_idx.tolist(),
-                'frame_confidences': confidence.tolist()
-            }
+            return results
             
         except Exception as e:
             logging.error(f"Classification decoding error: {str(e)}")
-            return {
+            return [{
                 'error': f'Classification decoding failed: {str(e)}',
                 'text': '',
                 'confidence': 0.0
-            }
+            } for _ in range(predictions.shape[0])]
     
     def validate_input_shape(self, input_data):
         """Validate that input data matches model expectations"""
@@ -269,7 +476,12 @@ class ModelLoader:
                 'model_classes': num_classes,
                 'encoder_classes': encoder_classes,
                 'trainable_params': self.model.count_params(),
-                'model_summary': str(self.model.summary()) if hasattr(self.model, 'summary') else 'N/A'
+                'compiled_inference': self.model.compiled,
+                'runtime': self.backend,
+                'decode_grammars': sorted(self.tries),
+                'model_version': self.model_version,
+                'inference_timing': self.get_timing_stats(),
+                'model_summary': self.model.summary()
             }
             
         except Exception as e:
@@ -0,0 +1,257 @@
+import logging
+import random
+import threading
+import time
+
+from model_loader import ModelLoader
+
+
+class ModelRegistry:
+    """Resident model versions, hot swaps and canary traffic
+
+    Each registered version is an entry dict holding its ``ModelLoader``, its
+    own ``BatchScheduler`` (from ``make_scheduler``) and its serving stats.
+    One entry is active. Optionally a second one is the candidate, and it
+    receives ``candidate_fraction`` of the requests.
+
+    Requests ``acquire`` an entry just before they submit their clip and
+    ``release`` it when done. A version that is replaced stops taking new
+    requests at once; its scheduler is stopped once its in-flight requests
+    are done. After ``drain_timeout`` seconds it leaves the stats, and the
+    last request to release it stops it, so a swap never drops a request.
+    ``load`` reads and warms a new model/encoder pair on a background thread
+    before it takes any traffic.
+    """
+
+    def __init__(self, make_scheduler, drain_timeout=30.0, **loader_kwargs):
+        self.make_scheduler = make_scheduler
+        self.drain_timeout = drain_timeout
+        self.loader_kwargs = loader_kwargs
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._serial = 0
+        self._loads = {}
+        self._retired = []
+        self.active = None
+        self.candidate = None
+        self.candidate_fraction = 0.0
+
+    def register(self, loader, role='active', fraction=None):
+        """Serve an already constructed loader as the active or candidate version, returns its name"""
+        if role not in ('active', 'candidate'):
+            raise ValueError(f"Unknown role: {role}")
+        with self._lock:
+            self._serial += 1
+            name = f"v{self._serial}"
+        entry = {
+            'name': name,
+            'loader': loader,
+            'scheduler': self.make_scheduler(loader),
+            'inflight': 0,
+            'registered_at': time.time(),
+            'stats': {
+                'requests': 0,
+                'errors': 0,
+                'total_latency_ms': 0.0,
+                'max_latency_ms': 0.0,
+                'total_inference_ms': 0.0,
+                'total_confidence': 0.0
+            }
+        }
+        with self._lock:
+            self._entries[name] = entry
+        self._assign(name, role, fraction)
+        logging.info(f"Model {name} ({loader.model_path}) registered as {role}")
+        return name
+
+    def _assign(self, name, role, fraction=None):
+        with self._lock:
+            if role == 'active':
+                retired = self.active
+                self.active = name
+                if self.candidate == name:
+                    self.candidate = None
+                    self.candidate_fraction = 0.0
+            else:
+                retired = self.candidate
+                self.candidate = name
+                if fraction is not None:
+                    self.candidate_fraction = min(max(float(fraction), 0.0), 1.0)
+            if retired == name:
+                retired = None
+        if retired is not None:
+            self._retire(retired)
+
+    def load(self, model_path, encoder_path, role='candidate', fraction=None, backend='auto'):
+        """Load and warm a model/encoder pair in the background, then register it
+
+        Returns a load id; its progress shows up under ``loads`` in ``get_stats``.
+        """
+        with self._lock:
+            load_id = f"load-{len(self._loads) + 1}"
+            self._loads[load_id] = {
+                'model_path': model_path,
+                'backend': backend,
+                'role': role,
+                'state': 'loading',
+                'version': None
+            }
+
+        def run():
+            loader = ModelLoader(model_path=model_path, encoder_path=encoder_path, load=False, backend=backend,
+                                 **self.loader_kwargs)
+            loader.load_model()
+            with self._lock:
+                status = self._loads[load_id]
+            if loader.load_state != 'ready':
+                status['state'] = 'failed'
+                logging.error(f"Model load {load_id} from {model_path} failed")
+                return
+            status['version'] = self.register(loader, role, fraction)
+            status['state'] = 'ready'
+
+        threading.Thread(target=run, name=load_id, daemon=True).start()
+        return load_id
+
+    def promote(self):
+        """Make the candidate the active version"""
+        with self._lock:
+            candidate = self.candidate
+        if candidate is None:
+            raise ValueError('No candidate model to promote')
+        self._assign(candidate, 'active')
+        return candidate
+
+    def remove_candidate(self):
+        """Stop sending traffic to the candidate and unload it once drained"""
+        with self._lock:
+            candidate = self.candidate
+            self.candidate = None
+            self.candidate_fraction = 0.0
+        if candidate is not None:
+            self._retire(candidate)
+        return candidate
+
+    def set_candidate_fraction(self, fraction):
+        with self._lock:
+            self.candidate_fraction = min(max(float(fraction), 0.0), 1.0)
+
+    def _retire(self, name):
+        def drain():
+            deadline = time.monotonic() + self.drain_timeout
+            while time.monotonic() < deadline:
+                with self._lock:
+                    if self._entries[name]['inflight'] == 0:
+                        break
+                time.sleep(0.05)
+            with self._lock:
+                entry = self._entries.pop(name)
+                self._retired.append(self._entry_stats(entry))
+                del self._retired[:-5]
+                entry['retired'] = True
+                inflight = entry['inflight']
+            if inflight:
+                logging.warning(f"Model {name} still has {inflight} requests in flight after "
+                                f"{self.drain_timeout}s, it stops when they are done")
+                return
+            entry['scheduler'].stop()
+            logging.info(f"Model {name} retired")
+
+        threading.Thread(target=drain, name=f"retire-{name}", daemon=True).start()
+
+    def _route(self):
+        # Callers hold the lock
+        name = self.active
+        if self.candidate is not None and random.random() < self.candidate_fraction:
+            name = self.candidate
+        return self._entries[name]
+
+    def choose(self):
+        """The version for one request (candidate with probability candidate_fraction), not yet pinned
+
+        Used to look up cached results before the clip is ready; pass it to ``acquire`` afterwards.
+        """
+        with self._lock:
+            return self._route()
+
+    def acquire(self, entry=None):
+        """Pin a version for one request until ``release``
+
+        ``entry`` (from ``choose``) is kept if it still takes traffic, otherwise a
+        version is picked again.
+        """
+        with self._lock:
+            if entry is None or entry['name'] not in (self.active, self.candidate):
+                entry = self._route()
+            entry['inflight'] += 1
+            return entry
+
+    def release(self, entry):
+        with self._lock:
+            entry['inflight'] -= 1
+            stop = entry.get('retired', False) and entry['inflight'] == 0
+        if stop:
+            entry['scheduler'].stop()
+            logging.info(f"Model {entry['name']} retired")
+
+    def submit(self, entry, processed_frames, decode_options=None):
+        """Queue a clip on an acquired version's scheduler, returns a future for its result"""
+        start = time.perf_counter()
+        future = entry['scheduler'].submit(processed_frames, decode_options)
+        future.add_done_callback(lambda done: self._record(entry, done, start))
+        return future
+
+    def _record(self, entry, future, start):
+        latency_ms = (time.perf_counter() - start) * 1000.0
+        result = None if future.cancelled() or future.exception() is not None else future.result()
+        with self._lock:
+            stats = entry['stats']
+            stats['requests'] += 1
+            if not isinstance(result, dict) or 'error' in result:
+                stats['errors'] += 1
+                return
+            stats['total_latency_ms'] += latency_ms
+            stats['max_latency_ms'] = max(stats['max_latency_ms'], latency_ms)
+            stats['total_inference_ms'] += result.get('inference_ms', 0.0)
+            stats['total_confidence'] += result.get('confidence', 0.0)
+
+    def active_loader(self):
+        with self._lock:
+            return self._entries[self.active]['loader']
+
+    def _entry_stats(self, entry):
+        stats = entry['stats']
+        succeeded = stats['requests'] - stats['errors']
+        return {
+            'name': entry['name'],
+            'model_path': entry['loader'].model_path,
+            'model_version': entry['loader'].model_version,
+            'backend': entry['loader'].backend,
+            'load_state': entry['loader'].load_state,
+            'inflight': entry['inflight'],
+            'requests': stats['requests'],
+            'errors': stats['errors'],
+            'mean_latency_ms': stats['total_latency_ms'] / succeeded if succeeded else 0.0,
+            'max_latency_ms': stats['max_latency_ms'],
+            'mean_inference_ms': stats['total_inference_ms'] / succeeded if succeeded else 0.0,
+            'mean_confidence': stats['total_confidence'] / succeeded if succeeded else 0.0,
+            'batching': entry['scheduler'].get_stats()
+        }
+
+    def get_stats(self):
+        """Roles, canary fraction and per-version serving stats"""
+        with self._lock:
+            return {
+                'active': self.active,
+                'candidate': self.candidate,
+                'candidate_fraction': self.candidate_fraction,
+                'versions': {name: self._entry_stats(entry) for name, entry in self._entries.items()},
+                'retired': list(self._retired),
+                'loads': {load_id: dict(status) for load_id, status in self._loads.items()}
+            }
+
+    def stop(self):
+        with self._lock:
+            entries = list(self._entries.values())
+        for entry in entries:
+            entry['scheduler'].stop()
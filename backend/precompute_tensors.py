@@ -0,0 +1,95 @@
+"""Preprocess the static test corpus once into a TensorStore
+
+Usage (from the backend directory):
+    python precompute_tensors.py [--source DIR] [--store DIR] [--crop-mode keyframe|track]
+                                 [--face-detector sfd|blazeface|haar|cached] [--target-fps FPS]
+                                 [--detect-width PX] [--recalibrate-every N]
+                                 [--landmark-batch-size N] [--force]
+
+Defaults match app.py (LUMAVOICE_DATA_PATH, LUMAVOICE_TENSOR_STORE_DIR,
+LUMAVOICE_CROP_MODE, LUMAVOICE_FACE_DETECTOR, LUMAVOICE_TARGET_FPS,
+LUMAVOICE_DETECT_WIDTH, LUMAVOICE_RECALIBRATE_EVERY,
+LUMAVOICE_LANDMARK_BATCH_SIZE), so /predict picks the stored clips up for
+test_path requests. Videos whose stored clip is still fresh are skipped
+unless --force is given.
+"""
+import argparse
+import os
+import time
+
+from tensor_store import TensorStore
+from video_preprocessor import VideoPreprocessor
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm', '.mpg')
+INDEX_FLUSH_EVERY = 50  # Publish progress so a long run is usable before it finishes
+
+
+def find_videos(source_root):
+    for folder, _, files in sorted(os.walk(source_root)):
+        for name in sorted(files):
+            if name.lower().endswith(VIDEO_EXTENSIONS):
+                yield os.path.join(folder, name)
+
+
+def precompute(source_root, store_root, crop_mode='keyframe', face_detector='sfd', target_fps=None,
+               detect_width=None, recalibrate_every=30, landmark_batch_size=1, force=False):
+    preprocessor = VideoPreprocessor(
+        crop_mode=crop_mode,
+        face_detector=face_detector,
+        target_fps=target_fps,
+        detect_width=detect_width,
+        recalibrate_every=recalibrate_every,
+        landmark_batch_size=landmark_batch_size
+    )
+    store = TensorStore(store_root, source_root, preprocessor.cache_config())
+
+    processed = skipped = failed = 0
+    start = time.perf_counter()
+    for video_path in find_videos(source_root):
+        if not force and store.is_fresh(video_path):
+            skipped += 1
+            continue
+        try:
+            stats = {}
+            frames = preprocessor.process_video(video_path, stats=stats)
+            if 'error' in stats:
+                # process_video still returns an all-zero clip, which must not be served as a real one
+                raise ValueError(stats['error'])
+            store.save(video_path, frames)
+            processed += 1
+            print(f"✅ Stored: {video_path}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ Failed: {video_path}: {e}")
+
+        if processed and processed % INDEX_FLUSH_EVERY == 0:
+            store.flush_index()
+
+    store.flush_index()
+    elapsed = time.perf_counter() - start
+    print(f"Done in {elapsed:.1f}s: {processed} stored, {skipped} already fresh, {failed} failed")
+    return {'processed': processed, 'skipped': skipped, 'failed': failed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', default=os.environ.get('LUMAVOICE_DATA_PATH', '/home/poras9868/data'))
+    parser.add_argument('--store', default=os.environ.get('LUMAVOICE_TENSOR_STORE_DIR', 'tensor_store'))
+    parser.add_argument('--crop-mode', default=os.environ.get('LUMAVOICE_CROP_MODE', 'keyframe'))
+    parser.add_argument('--face-detector', default=os.environ.get('LUMAVOICE_FACE_DETECTOR', 'sfd'))
+    parser.add_argument('--target-fps', type=float, default=float(os.environ.get('LUMAVOICE_TARGET_FPS', 25)),
+                        help='Resample faster sources to this frame rate (0 keeps every frame)')
+    parser.add_argument('--detect-width', type=int, default=int(os.environ.get('LUMAVOICE_DETECT_WIDTH', 640)),
+                        help='Detect faces on frames downscaled to this width (0 detects at full resolution)')
+    parser.add_argument('--recalibrate-every', type=int,
+                        default=int(os.environ.get('LUMAVOICE_RECALIBRATE_EVERY', 30)),
+                        help='In keyframe mode, re-detect landmarks every N frames')
+    parser.add_argument('--landmark-batch-size', type=int,
+                        default=int(os.environ.get('LUMAVOICE_LANDMARK_BATCH_SIZE', 1)),
+                        help='Keyframes sent through face detection as one batch (1 disables batching)')
+    parser.add_argument('--force', action='store_true', help='Reprocess videos even if their clip is fresh')
+    args = parser.parse_args()
+    precompute(args.source, args.store, crop_mode=args.crop_mode, face_detector=args.face_detector,
+               target_fps=args.target_fps, detect_width=args.detect_width,
+               recalibrate_every=args.recalibrate_every, landmark_batch_size=args.landmark_batch_size,
+               force=args.force)
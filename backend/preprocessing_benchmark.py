@@ -0,0 +1,264 @@
+"""Parity checks and timings for the VideoPreprocessor frame pipeline
+
+Usage (from the backend directory):
+    python preprocessing_benchmark.py                 # synthetic checks only
+    python preprocessing_benchmark.py clip1.mp4 ...   # plus full process_video timings,
+                                                      # a face detector comparison
+                                                      # and a detection scale comparison
+"""
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from face_detectors import FACE_DETECTORS, box_iou
+from inference_backends import to_float_input
+from video_preprocessor import VideoPreprocessor
+
+
+def _tf_reference_frame(preprocessor, cropped):
+    """The previous per-frame path: tf.image.resize, squeeze, cv2 fallback, /255"""
+    resized = preprocessor.resize_with_horizontal_padding(cropped)
+    processed = resized.numpy().squeeze()
+    if processed.shape != (preprocessor.target_height, preprocessor.target_width):
+        processed = cv2.resize(processed, (preprocessor.target_width, preprocessor.target_height))
+    return processed.astype(np.float32) / 255.0
+
+
+def check_resize_parity(num_cases=500, seed=0, atol=1.0 / 255.0):
+    """Compare the OpenCV frame path against the TensorFlow one on random crops
+
+    Crops range from smaller than the target (upscaling) to several times
+    larger (downscaling) and include very thin strips. The uint8 frames are
+    normalized the way the model backends do it, so the error includes the
+    rounding to whole pixel levels (``atol`` is one level).
+    """
+    preprocessor = VideoPreprocessor()
+    rng = np.random.default_rng(seed)
+    out = np.zeros((preprocessor.target_height, preprocessor.target_width), dtype=np.uint8)
+    max_error = 0.0
+
+    for _ in range(num_cases):
+        h = int(rng.integers(1, 400))
+        w = int(rng.integers(1, 600))
+        frame_gray = rng.integers(0, 256, size=(h, w), dtype=np.uint8)
+        crop = (0, h, 0, w)
+
+        expected = _tf_reference_frame(preprocessor, frame_gray)
+        preprocessor._crop_and_resize(frame_gray, crop, 0, out)
+        max_error = max(max_error, float(np.max(np.abs(to_float_input(out) - expected))))
+
+    return {
+        'cases': num_cases,
+        'max_abs_error': max_error,
+        'tolerance': atol,
+        'passed': max_error <= atol
+    }
+
+
+def benchmark_frame_path(iterations=750, crop_shape=(160, 260), seed=0):
+    """Time the per-frame crop/resize/normalize step on the TF path and the OpenCV path"""
+    preprocessor = VideoPreprocessor()
+    rng = np.random.default_rng(seed)
+    frame_gray = rng.integers(0, 256, size=crop_shape, dtype=np.uint8)
+    crop = (0, crop_shape[0], 0, crop_shape[1])
+    buffer = np.zeros((preprocessor.max_frames, preprocessor.target_height, preprocessor.target_width), dtype=np.uint8)
+
+    # Warm up both paths
+    _tf_reference_frame(preprocessor, frame_gray)
+    preprocessor._crop_and_resize(frame_gray, crop, 0, buffer[0])
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        _tf_reference_frame(preprocessor, frame_gray)
+    tf_ms = (time.perf_counter() - start) * 1000.0 / iterations
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        preprocessor._crop_and_resize(frame_gray, crop, i, buffer[i % preprocessor.max_frames])
+    cv_ms = (time.perf_counter() - start) * 1000.0 / iterations
+
+    return {
+        'crop_shape': crop_shape,
+        'tf_ms_per_frame': tf_ms,
+        'opencv_ms_per_frame': cv_ms,
+        'speedup': tf_ms / cv_ms if cv_ms > 0 else float('inf')
+    }
+
+
+def benchmark_video(path, repeats=3, **preprocessor_kwargs):
+    """Time full process_video runs on a real clip"""
+    preprocessor = VideoPreprocessor(**preprocessor_kwargs)
+    timings = []
+    stats = {}
+    for _ in range(repeats):
+        start = time.perf_counter()
+        preprocessor.process_video(path, stats=stats)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return {
+        'path': path,
+        'config': preprocessor_kwargs,
+        'best_ms': min(timings),
+        'mean_ms': sum(timings) / len(timings),
+        'stats': stats
+    }
+
+
+def _read_frames(path, max_frames):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def _crop_box(crop):
+    # Crops are (y1, y2, x1, x2); box_iou takes (x1, y1, x2, y2)
+    return (crop[2], crop[0], crop[3], crop[1])
+
+
+def _write_clip(frames, fps=25.0):
+    """Write frames to a temporary MJPG .avi so process_video can read them, returns its path"""
+    handle, path = tempfile.mkstemp(suffix='.avi')
+    os.close(handle)
+    height, width = frames[0].shape[:2]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def benchmark_detectors(path, detectors=FACE_DETECTORS, max_frames=75):
+    """Compare the face detector backends on one clip against SFD
+
+    Every frame goes through detection (no keyframe skipping), so the
+    per-frame latency isolates the detector. Crop quality is the IoU of each
+    frame's mouth crop with the SFD crop of the same frame. ``process_video_ms``
+    is a full keyframe-mode run with that backend.
+    """
+    frames = _read_frames(path, max_frames)
+    if not frames:
+        return {'path': path, 'error': 'no frames decoded'}
+
+    detectors = ['sfd'] + [name for name in detectors if name != 'sfd']
+    reference = None
+    results = {}
+    for name in detectors:
+        preprocessor = VideoPreprocessor(face_detector=name)
+        preprocessor._detect_landmarks(frames[0], preprocessor._new_crop_state())  # Warm up
+        state = preprocessor._new_crop_state()
+
+        crops = []
+        start = time.perf_counter()
+        for frame in frames:
+            landmarks = preprocessor._detect_landmarks(frame, state)
+            crops.append(None if landmarks is None else preprocessor._crop_from_landmarks(landmarks, frame.shape))
+        ms_per_frame = (time.perf_counter() - start) * 1000.0 / len(frames)
+
+        if reference is None:
+            reference = crops
+        ious = [
+            box_iou(_crop_box(crop), _crop_box(ref))
+            for crop, ref in zip(crops, reference) if crop is not None and ref is not None
+        ]
+        results[name] = {
+            'ms_per_frame': ms_per_frame,
+            'face_found_rate': sum(crop is not None for crop in crops) / len(crops),
+            'mean_crop_iou': float(np.mean(ious)) if ious else 0.0,
+            'min_crop_iou': float(np.min(ious)) if ious else 0.0,
+            'process_video_ms': benchmark_video(path, repeats=1, face_detector=name)['best_ms']
+        }
+
+    return {'path': path, 'frames': len(frames), 'detectors': results}
+
+
+def benchmark_detection_scale(path, widths=(None, 960, 640, 480, 320), upscale_width=1920, max_frames=75):
+    """Landmark detection at several ``detect_width`` settings against full resolution
+
+    Frames are upscaled to ``upscale_width`` first to stand in for 1080p
+    webcam uploads. Crop error is measured against the full-resolution crop
+    of the same frame, as IoU and as the mean corner offset in pixels.
+    ``roi_gray`` times the per-frame pixel path with whole-frame grayscale
+    conversion and with conversion of the crop only, and a full process_video
+    run of the upscaled clip with the default keyframe settings, which is
+    the path uploads take.
+    """
+    frames = _read_frames(path, max_frames)
+    if not frames:
+        return {'path': path, 'error': 'no frames decoded'}
+    if upscale_width and frames[0].shape[1] < upscale_width:
+        scale = upscale_width / frames[0].shape[1]
+        frames = [cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_LINEAR) for frame in frames]
+
+    reference = None
+    results = {}
+    for width in widths:
+        preprocessor = VideoPreprocessor(detect_width=width)
+        preprocessor._detect_landmarks(frames[0])  # Warm up
+
+        crops = []
+        start = time.perf_counter()
+        for frame in frames:
+            landmarks = preprocessor._detect_landmarks(frame)
+            crops.append(None if landmarks is None else preprocessor._crop_from_landmarks(landmarks, frame.shape))
+        ms_per_frame = (time.perf_counter() - start) * 1000.0 / len(frames)
+
+        if reference is None:
+            reference = crops
+        pairs = [(crop, ref) for crop, ref in zip(crops, reference) if crop is not None and ref is not None]
+        ious = [box_iou(_crop_box(crop), _crop_box(ref)) for crop, ref in pairs]
+        offsets = [np.abs(np.subtract(crop, ref)).mean() for crop, ref in pairs]
+        results[width or 'full'] = {
+            'ms_per_frame': ms_per_frame,
+            'face_found_rate': sum(crop is not None for crop in crops) / len(crops),
+            'mean_crop_iou': float(np.mean(ious)) if ious else 0.0,
+            'min_crop_iou': float(np.min(ious)) if ious else 0.0,
+            'mean_corner_offset_px': float(np.mean(offsets)) if offsets else 0.0
+        }
+
+    preprocessor = VideoPreprocessor()
+    crop = next((crop for crop in reference if crop is not None), preprocessor._default_crop(frames[0].shape))
+    out = np.zeros((preprocessor.target_height, preprocessor.target_width), dtype=np.uint8)
+    start = time.perf_counter()
+    for i, frame in enumerate(frames):
+        preprocessor._crop_and_resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), crop, i, out)
+    full_ms = (time.perf_counter() - start) * 1000.0 / len(frames)
+    start = time.perf_counter()
+    for i, frame in enumerate(frames):
+        preprocessor._crop_and_resize(frame, crop, i, out)
+    roi_ms = (time.perf_counter() - start) * 1000.0 / len(frames)
+
+    clip_path = _write_clip(frames)
+    try:
+        default_run = benchmark_video(clip_path, repeats=1, detect_width=640)
+    finally:
+        os.remove(clip_path)
+
+    return {
+        'path': path,
+        'frame_shape': frames[0].shape,
+        'widths': results,
+        'roi_gray': {
+            'full_frame_ms': full_ms,
+            'roi_only_ms': roi_ms,
+            'process_video_ms_per_frame': default_run['best_ms'] / len(frames)
+        }
+    }
+
+
+if __name__ == "__main__":
+    print(f"Resize parity: {check_resize_parity()}")
+    print(f"Frame path timing: {benchmark_frame_path()}")
+    for video_path in sys.argv[1:]:
+        print(f"process_video: {benchmark_video(video_path)}")
+        print(f"process_video resampled to 25 fps: {benchmark_video(video_path, target_fps=25)}")
+        print(f"Face detectors: {benchmark_detectors(video_path)}")
+        print(f"Detection scale: {benchmark_detection_scale(video_path)}")
@@ -0,0 +1,213 @@
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's contents, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Content-addressed LRU cache for predictions and preprocessed clips
+
+    Keys come from ``make_key``: a hash of the video bytes plus whatever else
+    the value depends on (model version, preprocessing config, decode
+    options). A video that changes, or a new model, is therefore never
+    served a stale entry. Values are either prediction dicts or clip tensors
+    (NumPy arrays).
+
+    The in-memory tier is bounded by entry count and by bytes. When
+    ``disk_dir`` is set, every entry is also written there (``.json`` for
+    predictions, ``.npy`` for tensors). A memory miss that hits on disk is
+    promoted back into memory. The disk tier has its own byte limit and drops
+    its least recently written files first.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=256 * 1024 * 1024,
+                 disk_dir=None, max_disk_bytes=2 * 1024 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'disk_evictions': 0
+        }
+
+        self._disk_bytes = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+
+    @staticmethod
+    def make_key(content_hash, **parts):
+        """Build a cache key from the video content hash and everything else the value depends on"""
+        payload = json.dumps({'content': content_hash, **parts}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _size_of(value):
+        if isinstance(value, np.ndarray):
+            return value.nbytes
+        return len(json.dumps(value, default=str))
+
+    def get(self, key):
+        """Look up a key in memory, then on disk; returns None on a miss"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return self._copy_out(value)
+
+        value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['disk_hits'] += 1
+            self._insert(key, value)
+            return self._copy_out(value)
+
+    def put(self, key, value):
+        """Store a prediction dict or a clip tensor"""
+        if isinstance(value, np.ndarray):
+            # Shared between requests from now on, so make sure nobody writes to it
+            value.setflags(write=False)
+        else:
+            value = copy.deepcopy(value)
+
+        with self._lock:
+            self._insert(key, value)
+        self._write_disk(key, value)
+
+    def _copy_out(self, value):
+        # Tensors are read-only and can be shared; dicts are copied so callers may edit them
+        return value if isinstance(value, np.ndarray) else copy.deepcopy(value)
+
+    def _insert(self, key, value):
+        size = self._size_of(value)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= self._size_of(old)
+        self._entries[key] = value
+        self._bytes += size
+
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= self._size_of(evicted)
+            self._stats['evictions'] += 1
+
+    def _disk_path(self, key, extension):
+        return os.path.join(self.disk_dir, key[:2], f"{key}{extension}")
+
+    def _disk_files(self):
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            tensor_path = self._disk_path(key, '.npy')
+            if os.path.exists(tensor_path):
+                return np.load(tensor_path, allow_pickle=False)
+            json_path = self._disk_path(key, '.json')
+            if os.path.exists(json_path):
+                with open(json_path, 'r') as f:
+                    return json.load(f)
+        except Exception as e:
+            logging.warning(f"Could not read cache entry {key} from disk: {e}")
+        return None
+
+    def _write_disk(self, key, value):
+        if not self.disk_dir:
+            return
+        try:
+            extension = '.npy' if isinstance(value, np.ndarray) else '.json'
+            path = self._disk_path(key, extension)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                if isinstance(value, np.ndarray):
+                    np.save(f, value, allow_pickle=False)
+                else:
+                    f.write(json.dumps(value, default=str).encode('utf-8'))
+            # Overwriting a key replaces its file, so only the difference counts
+            try:
+                old_size = os.path.getsize(path)
+            except OSError:
+                old_size = 0
+            os.replace(temp_path, path)
+
+            with self._lock:
+                self._disk_bytes += os.path.getsize(path) - old_size
+                over_limit = self._disk_bytes > self.max_disk_bytes
+            if over_limit:
+                self._trim_disk()
+        except Exception as e:
+            logging.warning(f"Could not write cache entry {key} to disk: {e}")
+
+    def _trim_disk(self):
+        files = sorted(self._disk_files(), key=lambda item: item[2])
+        total = sum(size for _, size, _ in files)
+        for path, size, _ in files:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                with self._lock:
+                    self._stats['disk_evictions'] += 1
+            except OSError:
+                continue
+        with self._lock:
+            self._disk_bytes = total
+
+    def get_stats(self):
+        """Get hit/miss counters and current occupancy"""
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+            stats.update({
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'disk_enabled': bool(self.disk_dir),
+                'disk_bytes': self._disk_bytes,
+                'hit_rate': (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+            })
+        return stats
+
+    def clear(self):
+        """Drop every in-memory entry (the disk tier is left alone)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
@@ -0,0 +1,86 @@
+import cv2
+import numpy as np
+
+from video_source import decode_image
+
+
+class StreamSession:
+    """Incremental preprocessing for a live frame stream
+
+    Frames are cropped one at a time as they arrive, with the same crop logic
+    as ``VideoPreprocessor.process_video`` (keyframe detection or optical-flow
+    tracking), and written into a ring buffer holding the latest
+    ``max_frames`` frames. ``window`` returns that buffer in time order as a
+    model-ready uint8 clip, padded with the last frame while the stream is still
+    shorter than a full clip, exactly like ``process_video`` pads short videos.
+
+    Sessions are not thread-safe; feed each one from a single task.
+    """
+
+    def __init__(self, preprocessor, stride=15, min_frames=15):
+        self.preprocessor = preprocessor
+        self.stride = max(1, int(stride))
+        self.min_frames = max(1, int(min_frames))
+        self.max_frames = preprocessor.max_frames
+        self._ring = np.zeros(
+            (self.max_frames, preprocessor.target_height, preprocessor.target_width),
+            dtype=np.uint8
+        )
+        self._state = preprocessor._new_crop_state()
+        self.frames_received = 0
+
+    def add_frame(self, frame):
+        """Crop one BGR frame (or encoded image bytes) into the window
+
+        Returns True when a partial transcript is due: every ``stride`` frames
+        once at least ``min_frames`` have arrived.
+        """
+        if isinstance(frame, (bytes, bytearray, memoryview)):
+            frame = decode_image(frame)
+            if frame is None:
+                raise ValueError('Frame is not a decodable image')
+
+        # Optical flow needs the whole frame in grayscale; keyframe crops convert only their ROI
+        tracking = self.preprocessor.crop_mode == 'track'
+        frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 and tracking else frame
+        slot = self._ring[self.frames_received % self.max_frames]
+        try:
+            crop = self.preprocessor._update_crop(frame, frame_gray, self.frames_received, self._state)
+            self.preprocessor._crop_and_resize(frame_gray, crop, self.frames_received, slot)
+        except Exception as e:
+            print(f"Error processing stream frame {self.frames_received}: {e}")
+            slot[...] = 0
+        self.frames_received += 1
+
+        return self.frames_received >= self.min_frames and self.frames_received % self.stride == 0
+
+    def window(self):
+        """The latest frames as a (1, max_frames, H, W, 1) clip, oldest first"""
+        clip = np.empty((1,) + self._ring.shape + (1,), dtype=np.uint8)
+        frames = clip[0, :, :, :, 0]
+        count = self.frames_received
+        if count == 0:
+            frames[...] = 0
+        elif count < self.max_frames:
+            frames[:count] = self._ring[:count]
+            frames[count:] = self._ring[count - 1]
+        else:
+            start = count % self.max_frames
+            tail = self.max_frames - start
+            frames[:tail] = self._ring[start:]
+            frames[tail:] = self._ring[:start]
+        return clip
+
+    def reset(self):
+        """Start over, e.g. when the user begins a new utterance"""
+        self._ring[...] = 0
+        self._state = self.preprocessor._new_crop_state()
+        self.frames_received = 0
+
+    def get_stats(self):
+        return {
+            'frames_received': self.frames_received,
+            'window_frames': min(self.frames_received, self.max_frames),
+            'detections': self._state['detections'],
+            'tracked_frames': self._state['tracked_frames']
+        }
@@ -0,0 +1,158 @@
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from inference_backends import to_pixel_input
+
+
+class TensorStore:
+    """On-disk store of preprocessed mouth-crop clips for a video corpus
+
+    Each clip is stored as its own ``.npy`` file of uint8 frames
+    ``(max_frames, height, width)``, the pixels process_video returns without
+    the batch and channel axes. Clips are opened memory-mapped, so a lookup
+    reads no pixel data until it is used.
+    ``index.json`` maps each source video (relative to ``source_root``) to
+    its clip file, plus the source's size and mtime and the preprocessing
+    config the clip was made with. A clip counts as fresh only if all three
+    still match; otherwise ``load`` returns None and the caller preprocesses
+    the video as usual.
+
+    The index is re-read whenever its file changes, so clips written by
+    ``precompute_tensors.py`` show up in a running server without a restart.
+    """
+
+    INDEX_FILE = 'index.json'
+
+    def __init__(self, root, source_root, preprocess_config):
+        self.root = root
+        self.source_root = os.path.abspath(source_root)
+        self.preprocess_config = dict(preprocess_config)
+        self._index = {}
+        self._index_mtime = None
+        self._lock = threading.Lock()
+        self._reload_index()
+
+    @property
+    def index_path(self):
+        return os.path.join(self.root, self.INDEX_FILE)
+
+    def _relative(self, source_path):
+        relative = os.path.relpath(os.path.abspath(source_path), self.source_root)
+        if relative.startswith(os.pardir):
+            return None
+        return relative.replace(os.sep, '/')
+
+    def _reload_index(self):
+        try:
+            mtime = os.stat(self.index_path).st_mtime_ns
+        except OSError:
+            return
+        with self._lock:
+            if mtime == self._index_mtime:
+                return
+        try:
+            with open(self.index_path, 'r') as f:
+                index = json.load(f)
+        except Exception as e:
+            logging.warning(f"Could not read tensor store index {self.index_path}: {e}")
+            return
+        with self._lock:
+            self._index = index.get('clips', {})
+            self._index_mtime = mtime
+
+    def _source_signature(self, source_path):
+        stat = os.stat(source_path)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def is_fresh(self, source_path):
+        """Whether a clip exists for this video and still matches the video and the config"""
+        relative = self._relative(source_path)
+        if relative is None:
+            return False
+        with self._lock:
+            entry = self._index.get(relative)
+        if entry is None:
+            return False
+        try:
+            signature = self._source_signature(source_path)
+        except OSError:
+            return False
+        return (entry.get('size') == signature['size']
+                and entry.get('mtime_ns') == signature['mtime_ns']
+                and entry.get('config') == self.preprocess_config
+                and os.path.exists(os.path.join(self.root, entry['file'])))
+
+    def load(self, source_path):
+        """Memory-map the stored uint8 clip for a video, None if missing or stale"""
+        self._reload_index()
+        if not self.is_fresh(source_path):
+            return None
+        with self._lock:
+            entry = self._index[self._relative(source_path)]
+        try:
+            return np.load(os.path.join(self.root, entry['file']), mmap_mode='r', allow_pickle=False)
+        except Exception as e:
+            logging.warning(f"Could not load stored clip for {source_path}: {e}")
+            return None
+
+    def load_model_input(self, source_path):
+        """Stored clip as the (1, frames, height, width, 1) uint8 array process_video returns
+
+        The result is a read-only view of the memory-mapped file, nothing is copied.
+        """
+        clip = self.load(source_path)
+        if clip is None:
+            return None
+        return self.to_model_input(clip)
+
+    @staticmethod
+    def to_model_input(clip):
+        return clip.reshape((1,) + clip.shape + (1,))
+
+    @staticmethod
+    def quantize(processed_frames):
+        """(1, frames, height, width, 1) clip -> (frames, height, width) uint8
+
+        Clips from process_video already are uint8; float clips in [0, 1] are rounded.
+        """
+        return to_pixel_input(processed_frames).reshape(processed_frames.shape[1:4])
+
+    def save(self, source_path, processed_frames):
+        """Write the clip for one video; call ``flush_index`` afterwards to publish it"""
+        relative = self._relative(source_path)
+        if relative is None:
+            raise ValueError(f"{source_path} is outside {self.source_root}")
+
+        file_name = os.path.splitext(relative)[0] + '.npy'
+        clip_path = os.path.join(self.root, file_name)
+        os.makedirs(os.path.dirname(clip_path), exist_ok=True)
+        temp_path = f"{clip_path}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.save(f, self.quantize(processed_frames), allow_pickle=False)
+        os.replace(temp_path, clip_path)
+
+        entry = {'file': file_name, 'config': self.preprocess_config}
+        entry.update(self._source_signature(source_path))
+        with self._lock:
+            self._index[relative] = entry
+
+    def flush_index(self):
+        """Atomically rewrite index.json with every clip saved so far"""
+        os.makedirs(self.root, exist_ok=True)
+        with self._lock:
+            payload = {'source_root': self.source_root, 'clips': dict(self._index)}
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(payload, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self.index_path)
+        with self._lock:
+            self._index_mtime = os.stat(self.index_path).st_mtime_ns
+
+    def get_stats(self):
+        """Number of clips in the index"""
+        with self._lock:
+            return {'root': self.root, 'clips': len(self._index)}
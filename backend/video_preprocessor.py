@@ -1,82 +1,490 @@
-import torch
-import face_alignment
 import cv2
 import numpy as np
-import tensorflow as tf
 from typing import Tuple
 import os
-from tensorflow.keras.models import load_model
-from sklearn.preprocessing import LabelEncoder
-from tensorflow.keras.preprocessing.sequence import pad_sequences
 import pickle
+import threading
+from ctc_decoder import greedy_ctc_decode
+from inference_backends import to_float_input
+from video_source import open_video
+from face_detectors import FACE_DETECTORS, HaarFaceDetector, box_iou
 
-# Initialize face alignment once
-fa = face_alignment.FaceAlignment(
-    face_alignment.LandmarksType.TWO_D,
-    flip_input=False,
-    device='cuda' if torch.cuda.is_available() else 'cpu'
+# Face alignment models, one per face detector, each built once per process on
+# first use (torch and face_alignment are only imported then)
+_face_alignment_models = {}
+_face_alignment_lock = threading.Lock()
+
+def get_face_alignment(face_detector='sfd'):
+    """Shared FaceAlignment using the given face_alignment detector ('sfd' or 'blazeface')"""
+    with _face_alignment_lock:
+        model = _face_alignment_models.get(face_detector)
+        if model is None:
+            import torch
+            import face_alignment
+            model = face_alignment.FaceAlignment(
+                face_alignment.LandmarksType.TWO_D,
+                flip_input=False,
+                device='cuda' if torch.cuda.is_available() else 'cpu',
+                face_detector=face_detector
+            )
+            _face_alignment_models[face_detector] = model
+        return model
+
+# 'cached' detector: regression from the previous box is kept while the new
+# landmarks still overlap it this much, otherwise SFD runs again
+CACHED_BOX_MIN_IOU = 0.3
+
+# Landmarks followed by optical flow in tracking mode: the crop anchors
+# (cheeks, chin, nose base) plus the outer and inner lip contours
+TRACKED_LANDMARKS = np.array([3, 8, 13, 33] + list(range(48, 68)))
+
+LK_PARAMS = dict(
+    winSize=(21, 21),
+    maxLevel=3,
+    criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01)
 )
 
+# Above this a reported frame rate is not trusted for resampling
+MAX_SOURCE_FPS = 240.0
+
+# Keyframe batching buffers decoded frames until their keyframe's landmarks
+# are in; the buffer is flushed early once it holds this many bytes, so a
+# 1080p upload keeps memory bounded (about ten BGR frames)
+MAX_PENDING_BYTES = 64 * 1024 * 1024
+
 class VideoPreprocessor:
-    def __init__(self, max_frames=75, target_width=100, target_height=50):
+    def __init__(self, max_frames=75, target_width=100, target_height=50,
+                 crop_mode='keyframe', recalibrate_every=30,
+                 min_tracking_confidence=0.7, max_flow_error=2.0,
+                 landmark_batch_size=1, face_detector='sfd', target_fps=None,
+                 detect_width=None):
+        """
+        crop_mode:
+            'keyframe' - run landmark detection every ``recalibrate_every`` frames
+                         and keep the crop fixed in between
+            'track'    - detect once, then carry the landmarks forward with
+                         Lucas-Kanade optical flow and update the crop every frame;
+                         detection reruns only when tracking confidence drops
+
+        landmark_batch_size:
+            in keyframe mode, how many keyframes are collected and sent through
+            face detection and landmark regression as one batch (1 disables batching).
+            Every frame between them is buffered meanwhile (up to
+            ``MAX_PENDING_BYTES``), so this only pays off when ``recalibrate_every``
+            is small enough for a clip to have several keyframes per batch; with
+            the default of 30 a 75-frame clip has three
+
+        face_detector:
+            how faces are found before landmark regression, one of
+            ``face_detectors.FACE_DETECTORS`` ('sfd', 'blazeface', 'haar', 'cached')
+
+        target_fps:
+            frame rate the model was trained at (GRID clips are 25 fps). Sources
+            recorded faster are resampled to it, so ``max_frames`` covers the
+            same span of speech; frames in between are grabbed but not decoded
+            into images or processed. None keeps every source frame.
+
+        detect_width:
+            frames wider than this are downscaled to it before face detection
+            and landmark regression, and the landmarks are scaled back to the
+            full frame, so detection cost stays flat for 1080p uploads. The
+            mouth crop itself is always cut from the full-resolution frame.
+            None detects at full resolution.
+        """
+        if crop_mode not in ('keyframe', 'track'):
+            raise ValueError(f"Unknown crop_mode: {crop_mode}")
+        if face_detector not in FACE_DETECTORS:
+            raise ValueError(f"Unknown face_detector: {face_detector}")
         self.max_frames = max_frames
         self.target_width = target_width
         self.target_height = target_height
+        self.crop_mode = crop_mode
+        self.recalibrate_every = recalibrate_every
+        self.min_tracking_confidence = min_tracking_confidence
+        self.max_flow_error = max_flow_error
+        self.landmark_batch_size = max(1, int(landmark_batch_size))
+        self.face_detector = face_detector
+        self._haar = HaarFaceDetector() if face_detector == 'haar' else None
+        self.target_fps = float(target_fps) if target_fps else None
+        self.detect_width = int(detect_width) if detect_width else None
 
-    def measurements(self, frame):
-        """Extract crop measurements from a single frame with better error handling"""
+    @property
+    def _fa(self):
+        # Loaded on first use, so importing or constructing this class stays cheap
+        return get_face_alignment(self._face_alignment_detector)
+
+    @property
+    def _face_alignment_detector(self):
+        return 'blazeface' if self.face_detector == 'blazeface' else 'sfd'
+
+    def warmup(self):
+        """Load the face alignment model now instead of on the first frame"""
+        get_face_alignment(self._face_alignment_detector)
+        if self._haar is not None:
+            self._haar._classifier()
+
+    def is_warm(self):
+        return self._face_alignment_detector in _face_alignment_models
+
+    def cache_config(self):
+        """Settings that change the output tensor, used to key cached clips"""
+        return {
+            'max_frames': self.max_frames,
+            'target_width': self.target_width,
+            'target_height': self.target_height,
+            'crop_mode': self.crop_mode,
+            'face_detector': self.face_detector,
+            'target_fps': self.target_fps,
+            'detect_width': self.detect_width,
+            'recalibrate_every': self.recalibrate_every,
+            'landmark_batch_size': self.landmark_batch_size,
+            'min_tracking_confidence': self.min_tracking_confidence,
+            'max_flow_error': self.max_flow_error
+        }
+
+    def _default_crop(self, frame_shape):
+        """Default crop for the mouth region when no face is found"""
+        h, w = frame_shape[:2]
+        return (int(h * 0.4), int(h * 0.8), int(w * 0.2), int(w * 0.8))
+
+    def _detection_frame(self, frame):
+        """The frame face detection runs on, and its scale relative to ``frame``
+
+        Bilinear downscaling reads a fixed number of source pixels per output
+        pixel, so its cost follows the detection size, not the input size.
+        """
+        width = frame.shape[1]
+        if self.detect_width is None or width <= self.detect_width:
+            return frame, 1.0
+        scale = self.detect_width / width
+        small = cv2.resize(frame, (self.detect_width, max(1, int(round(frame.shape[0] * scale)))),
+                           interpolation=cv2.INTER_LINEAR)
+        return small, scale
+
+    def _detect_landmarks(self, frame, state=None):
+        """Find the face with the configured detector and regress its landmarks
+
+        Returns (68, 2) landmarks or None. ``state`` is the per-clip crop state;
+        the 'cached' detector keeps its face box there between calls.
+        """
+        if self.face_detector == 'haar':
+            small, scale = self._detection_frame(frame)
+            try:
+                face_box = self._haar.detect(small)
+            except Exception as e:
+                print(f"Error in Haar face detection: {e}")
+                return None
+            if face_box is None:
+                return None
+            return self._regress_landmarks(frame, tuple(coord / scale for coord in face_box))
+
+        if self.face_detector == 'cached' and state is not None and state.get('face_box') is not None:
+            landmarks = self._regress_landmarks(frame, state['face_box'])
+            if landmarks is not None:
+                face_box = self._face_box_from_landmarks(landmarks, frame.shape)
+                if box_iou(state['face_box'], face_box) >= CACHED_BOX_MIN_IOU:
+                    state['face_box'] = face_box
+                    return landmarks
+            state['face_box'] = None
+
+        landmarks = self._full_detect_landmarks(frame)
+        if self.face_detector == 'cached' and state is not None and landmarks is not None:
+            state['face_box'] = self._face_box_from_landmarks(landmarks, frame.shape)
+        return landmarks
+
+    def _full_detect_landmarks(self, frame):
+        """Run full face detection and landmark regression, returns (68, 2) landmarks or None"""
         try:
-            preds = fa.get_landmarks(frame)
+            small, scale = self._detection_frame(frame)
+            preds = self._fa.get_landmarks(small)
             if not preds or len(preds) == 0:
-                # Return default crop for mouth region
-                h, w = frame.shape[:2]
-                return (int(h * 0.4), int(h * 0.8), int(w * 0.2), int(w * 0.8))
+                return None
 
             landmarks = preds[0]
-            
+
             # Validate landmarks array
             if landmarks.shape[0] < 68:
-                h, w = frame.shape[:2]
-                return (int(h * 0.4), int(h * 0.8), int(w * 0.2), int(w * 0.8))
-            
-            # Key landmarks for mouth region
-            nose_base = landmarks[33]
-            chin_bottom = landmarks[8]
-            lip_center = landmarks[66]
-            left_lip = landmarks[48]
-            right_lip = landmarks[54]
-            left_cheek = landmarks[3]
-            right_cheek = landmarks[13]
-
-            # Calculate crop boundaries
-            crop_y1 = int(nose_base[1])
-            crop_y2 = int((chin_bottom[1] + lip_center[1]) / 2)
-            
-            # Compute padding based on cheek-to-lip distances
-            left_dist = np.linalg.norm(left_lip - left_cheek)
-            right_dist = np.linalg.norm(right_lip - right_cheek)
-            min_padding = int(min(left_dist, right_dist) * 0.5)  # Reduce padding slightly
-            
-            crop_x1 = int(left_cheek[0] - min_padding)
-            crop_x2 = int(right_cheek[0] + min_padding)
+                return None
 
-            # Ensure valid crop boundaries
-            h, w = frame.shape[:2]
-            crop_y1 = max(0, min(crop_y1, h - 10))
-            crop_y2 = max(crop_y1 + 10, min(crop_y2, h))
-            crop_x1 = max(0, min(crop_x1, w - 10))
-            crop_x2 = max(crop_x1 + 10, min(crop_x2, w))
-            
-            return (crop_y1, crop_y2, crop_x1, crop_x2)
+            return np.asarray(landmarks[:68, :2], dtype=np.float32) / np.float32(scale)
+
+        except Exception as e:
+            print(f"Error in landmark detection: {e}")
+            return None
+
+    def _regress_landmarks(self, frame, face_box):
+        """Landmark regression only, seeded with a known face box (x1, y1, x2, y2)
+
+        Skips the face detector, which is most of the cost of ``_detect_landmarks``.
+        Returns (68, 2) landmarks or None.
+        """
+        try:
+            small, scale = self._detection_frame(frame)
+            preds = self._fa.get_landmarks(small, detected_faces=[np.asarray(face_box, dtype=np.float32) * scale])
+            if not preds or len(preds) == 0 or preds[0].shape[0] < 68:
+                return None
+            return np.asarray(preds[0][:68, :2], dtype=np.float32) / np.float32(scale)
+
+        except Exception as e:
+            print(f"Error in landmark regression: {e}")
+            return None
+
+    def _face_box_from_landmarks(self, landmarks, frame_shape):
+        """Face box (x1, y1, x2, y2) around 68-point landmarks, sized like a detector box
+
+        Detector boxes reach above the eyebrows, so the landmark extent is
+        grown mostly upwards.
+        """
+        x1, y1 = landmarks.min(axis=0)
+        x2, y2 = landmarks.max(axis=0)
+        width, height = x2 - x1, y2 - y1
+        h, w = frame_shape[:2]
+        return (
+            float(max(0, x1 - 0.05 * width)),
+            float(max(0, y1 - 0.2 * height)),
+            float(min(w - 1, x2 + 0.05 * width)),
+            float(min(h - 1, y2 + 0.05 * height))
+        )
+
+    def _detect_landmarks_batch(self, frames, state=None):
+        """Run face detection and landmark regression on several frames in one batch
+
+        Returns a list with (68, 2) landmarks or None per frame. Falls back to
+        one call per frame if the batch call is unavailable or fails.
+        """
+        # Only face_alignment's own detectors run batched; the others go frame by frame, in order
+        batchable = self.face_detector in ('sfd', 'blazeface') and hasattr(self._fa, 'get_landmarks_from_batch')
+        if len(frames) == 1 or not batchable:
+            return [self._detect_landmarks(frame, state) for frame in frames]
+
+        try:
+            import torch
+            detection_frames = [self._detection_frame(frame) for frame in frames]
+            scales = [scale for _, scale in detection_frames]
+            batch = torch.from_numpy(np.ascontiguousarray(np.stack([small for small, _ in detection_frames])))
+            batch = batch.permute(0, 3, 1, 2).float()
+            with torch.no_grad():
+                preds = self._fa.get_landmarks_from_batch(batch)
+
+            results = []
+            for pred, scale in zip(preds, scales):
+                if pred is None or len(pred) == 0:
+                    results.append(None)
+                    continue
+                # One array per face, or all faces concatenated, depending on version
+                landmarks = np.asarray(pred[0] if isinstance(pred, list) else pred)
+                if landmarks.ndim == 3:
+                    landmarks = landmarks[0]
+                if landmarks.shape[0] < 68:
+                    results.append(None)
+                    continue
+                results.append(np.asarray(landmarks[:68, :2], dtype=np.float32) / np.float32(scale))
+            return results
+
+        except Exception as e:
+            print(f"Error in batched landmark detection, falling back to per-frame: {e}")
+            return [self._detect_landmarks(frame, state) for frame in frames]
+
+    def _crop_from_landmarks(self, landmarks, frame_shape):
+        """Compute (y1, y2, x1, x2) mouth crop boundaries from 68-point landmarks"""
+        # Key landmarks for mouth region
+        nose_base = landmarks[33]
+        chin_bottom = landmarks[8]
+        lip_center = landmarks[66]
+        left_lip = landmarks[48]
+        right_lip = landmarks[54]
+        left_cheek = landmarks[3]
+        right_cheek = landmarks[13]
+
+        # Calculate crop boundaries
+        crop_y1 = int(nose_base[1])
+        crop_y2 = int((chin_bottom[1] + lip_center[1]) / 2)
+        
+        # Compute padding based on cheek-to-lip distances
+        left_dist = np.linalg.norm(left_lip - left_cheek)
+        right_dist = np.linalg.norm(right_lip - right_cheek)
+        min_padding = int(min(left_dist, right_dist) * 0.5)  # Reduce padding slightly
+        
+        crop_x1 = int(left_cheek[0] - min_padding)
+        crop_x2 = int(right_cheek[0] + min_padding)
+
+        # Ensure valid crop boundaries
+        h, w = frame_shape[:2]
+        crop_y1 = max(0, min(crop_y1, h - 10))
+        crop_y2 = max(crop_y1 + 10, min(crop_y2, h))
+        crop_x1 = max(0, min(crop_x1, w - 10))
+        crop_x2 = max(crop_x1 + 10, min(crop_x2, w))
+        
+        return (crop_y1, crop_y2, crop_x1, crop_x2)
+
+    def measurements(self, frame, state=None):
+        """Extract crop measurements from a single frame with better error handling"""
+        try:
+            landmarks = self._detect_landmarks(frame, state)
+            if landmarks is None:
+                return self._default_crop(frame.shape)
+
+            return self._crop_from_landmarks(landmarks, frame.shape)
             
         except Exception as e:
             print(f"Error in measurements: {e}")
+            return self._default_crop(frame.shape)
+
+    def _track_landmarks(self, prev_gray, gray, landmarks):
+        """Carry landmarks from the previous frame forward with sparse optical flow
+
+        Only the mouth and crop-anchor points are tracked (forward and backward,
+        so drifting points can be rejected). Landmarks that are not tracked, or
+        that failed, move by the median displacement of the good ones.
+
+        Returns (landmarks, confidence) where confidence is the fraction of
+        tracked points that passed the forward-backward check.
+        """
+        points = landmarks[TRACKED_LANDMARKS].reshape(-1, 1, 2)
+        forward, status_fwd, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None, **LK_PARAMS)
+        if forward is None:
+            return landmarks, 0.0
+        backward, status_bwd, _ = cv2.calcOpticalFlowPyrLK(gray, prev_gray, forward, None, **LK_PARAMS)
+        if backward is None:
+            return landmarks, 0.0
+
+        fb_error = np.linalg.norm((points - backward).reshape(-1, 2), axis=1)
+        good = (status_fwd.ravel() == 1) & (status_bwd.ravel() == 1) & (fb_error < self.max_flow_error)
+        confidence = float(good.mean())
+        if not good.any():
+            return landmarks, confidence
+
+        displacement = (forward - points).reshape(-1, 2)
+        shift = np.median(displacement[good], axis=0)
+
+        tracked = landmarks + shift
+        tracked_points = tracked[TRACKED_LANDMARKS]
+        tracked_points[good] = forward.reshape(-1, 2)[good]
+        tracked[TRACKED_LANDMARKS] = tracked_points
+        return tracked.astype(np.float32), confidence
+
+    def _new_crop_state(self):
+        return {
+            'crop': None,
+            'landmarks': None,
+            'prev_gray': None,
+            'retry_at': 0,
+            'face_box': None,
+            'detections': 0,
+            'tracked_frames': 0
+        }
+
+    def _flush_keyframes(self, pending, keyframes, state, frames, debug=False):
+        """Detect landmarks for the collected keyframes in one batch, then crop the buffered frames
+
+        ``pending`` holds (frame_index, frame) in decode order, with the frame
+        still in BGR (None for frames that failed); only its crop is converted
+        to grayscale. ``keyframes`` holds (frame_index, frame).
+        Each buffered frame uses the crop of the latest keyframe at or before it
+        and is written to ``frames[frame_index]``.
+        """
+        crops = {}
+        if keyframes:
+            landmarks_list = self._detect_landmarks_batch([frame for _, frame in keyframes], state)
+            state['detections'] += len(keyframes)
+            for (index, frame), landmarks in zip(keyframes, landmarks_list):
+                if landmarks is None:
+                    crops[index] = self._default_crop(frame.shape)
+                else:
+                    try:
+                        crops[index] = self._crop_from_landmarks(landmarks, frame.shape)
+                    except Exception as e:
+                        print(f"Error in measurements: {e}")
+                        crops[index] = self._default_crop(frame.shape)
+
+        for index, frame in pending:
+            if index in crops:
+                state['crop'] = crops[index]
+            if frame is None or state['crop'] is None:
+                frames[index] = 0
+                continue
+            try:
+                self._crop_and_resize(frame, state['crop'], index, frames[index], debug)
+            except Exception as e:
+                print(f"Error processing frame {index}: {e}")
+                frames[index] = 0
+
+        pending.clear()
+        keyframes.clear()
+
+    def _crop_and_resize(self, frame, crop, frame_count, out, debug=False):
+        """Crop a frame and resize it to the target size into ``out``
+
+        ``frame`` may be BGR or already grayscale; a BGR frame is converted to
+        grayscale over the crop only, never as a whole.
+        ``out`` is a (target_height, target_width) uint8 view into the clip
+        buffer. Pixels stay uint8; the model backends scale them to [0, 1]
+        (see ``inference_backends.to_float_input``). Bilinear resizing with
+        OpenCV matches ``tf.image.resize`` (half-pixel centers, no
+        antialiasing) to within one pixel level, so this gives the values of
+        ``resize_with_horizontal_padding`` without the TensorFlow round trip.
+        """
+        # Apply crop
+        y1, y2, x1, x2 = crop
+        cropped = frame[y1:y2, x1:x2]
+        
+        # Ensure cropped region is not empty
+        if cropped.size == 0:
+            if debug:
+                print(f"Empty crop at frame {frame_count}, using default")
             h, w = frame.shape[:2]
-            return (int(h * 0.4), int(h * 0.8), int(w * 0.2), int(w * 0.8))
+            cropped = frame[h//4:3*h//4, w//4:3*w//4]
+
+        if cropped.ndim == 3:
+            cropped = cv2.cvtColor(cropped, cv2.COLOR_BGR2GRAY)
+
+        # Resize straight into the output buffer
+        cv2.resize(cropped, (self.target_width, self.target_height), dst=out, interpolation=cv2.INTER_LINEAR)
+        
+        if debug and frame_count < 5:
+            print(f"Frame {frame_count}: shape={out.shape}, min={out.min()}, max={out.max()}")
+
+        return out
+
+    def _update_crop(self, frame, frame_gray, frame_count, state):
+        """Work out the crop for this frame, detecting or tracking landmarks as configured"""
+        if self.crop_mode == 'keyframe':
+            # Recalibrate crop region every N frames or on first frame
+            if frame_count % self.recalibrate_every == 0 or state['crop'] is None:
+                state['crop'] = self.measurements(frame, state)
+                state['detections'] += 1
+            return state['crop']
+
+        if state['landmarks'] is not None:
+            landmarks, confidence = self._track_landmarks(state['prev_gray'], frame_gray, state['landmarks'])
+            if confidence >= self.min_tracking_confidence:
+                state['landmarks'] = landmarks
+                state['crop'] = self._crop_from_landmarks(landmarks, frame.shape)
+                state['tracked_frames'] += 1
+            else:
+                # Tracking lost, detect again right away
+                state['landmarks'] = None
+                state['retry_at'] = frame_count
+
+        if state['landmarks'] is None and (state['crop'] is None or frame_count >= state['retry_at']):
+            landmarks = self._detect_landmarks(frame, state)
+            state['detections'] += 1
+            if landmarks is None:
+                # No face: keep the previous crop (or the default) and retry later
+                if state['crop'] is None:
+                    state['crop'] = self._default_crop(frame.shape)
+                state['retry_at'] = frame_count + self.recalibrate_every
+            else:
+                state['landmarks'] = landmarks
+                state['crop'] = self._crop_from_landmarks(landmarks, frame.shape)
+
+        state['prev_gray'] = frame_gray
+        return state['crop']
 
     def resize_with_horizontal_padding(self, image):
         """Resize image with proper padding and aspect ratio handling"""
         try:
+            import tensorflow as tf
             if len(image.shape) == 2:
                 image = np.expand_dims(image, axis=-1)
             
@@ -92,122 +500,173 @@ class VideoPreprocessor:
         except Exception as e:
             print(f"Error in resize_with_horizontal_padding: {e}")
             # Return zero array with correct dimensions
+            import tensorflow as tf
             return tf.zeros([self.target_height, self.target_width, 1], dtype=tf.float32)
 
-    def process_video(self, path: str, debug=False) -> np.ndarray:
-        """Process video with enhanced error handling and consistency"""
-        if not os.path.exists(path):
-            print(f"Error: Video file not found: {path}")
-            return self._create_empty_frames()
+    def _frame_step(self, source_fps):
+        """Source frames per output frame, 1.0 when no resampling is needed
+
+        Sources at or below ``target_fps``, and implausible rates (containers
+        such as MediaRecorder WebM report 0 or 1000), are read frame by frame.
+        """
+        if self.target_fps is None or not 0 < source_fps <= MAX_SOURCE_FPS:
+            return 1.0
+        return max(1.0, source_fps / self.target_fps)
+
+    def process_video(self, path, debug=False, stats=None) -> np.ndarray:
+        """Process video with enhanced error handling and consistency
+
+        ``path`` may be a file path, or the video itself as bytes or a binary
+        file object, which is decoded in memory (see ``video_source``).
+        Returns a (1, max_frames, height, width, 1) uint8 clip.
+        If a ``stats`` dict is passed it is filled with landmark detection and
+        tracking counts for this clip, and with an ``error`` message when the
+        video could not be read (the clip returned is then all zeros).
+        """
+        in_memory = not isinstance(path, (str, os.PathLike))
+        if in_memory:
+            path_label = '<in-memory video>'
+        else:
+            path_label = path
+            if not os.path.exists(path):
+                return self._failed(f"Video file not found: {path}", stats)
         
-        cap = cv2.VideoCapture(path)
+        cap = open_video(path)
         
         if not cap.isOpened():
-            print(f"Error: Could not open video: {path}")
-            return self._create_empty_frames()
+            return self._failed(f"Could not open video: {path_label}", stats)
         
-        frames = []
-        current_crop = None
+        # The model input is allocated once, as uint8 pixels (a quarter of the
+        # float32 size); every processed frame is written straight into it
+        # through a (max_frames, H, W) view
+        frames_array = np.zeros((1, self.max_frames, self.target_height, self.target_width, 1), dtype=np.uint8)
+        frames = frames_array[0, :, :, :, 0]
+        crop_state = self._new_crop_state()
         frame_count = 0
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        source_fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_step = self._frame_step(source_fps)
+        source_index = 0
         
         if debug:
-            print(f"Processing video: {path}")
+            print(f"Processing video: {path_label}")
             print(f"Total frames in video: {total_frames}")
+            print(f"Source fps: {source_fps:.2f}, taking every {frame_step:.2f} frames")
         
+        # (a negative count means the container does not say, e.g. MediaRecorder WebM)
         if total_frames == 0:
-            print(f"Warning: No frames found in video: {path}")
             cap.release()
-            return self._create_empty_frames()
+            return self._failed(f"No frames found in video: {path_label}", stats)
+
+        # Keyframe mode with batching: frames wait here until their keyframe's landmarks are in
+        batch_keyframes = self.crop_mode == 'keyframe' and self.landmark_batch_size > 1
+        pending = []
+        pending_keyframes = []
+        pending_bytes = 0
+        # Whole grayscale frames are only needed for optical flow; everywhere
+        # else only the mouth crop is converted
+        full_gray = self.crop_mode == 'track'
 
-        while len(frames) < self.max_frames:
+        while frame_count < self.max_frames:
+            # Advance to the source frame nearest this output frame's timestamp;
+            # frames in between are only grabbed
+            if frame_step > 1.0:
+                wanted = int(frame_count * frame_step + 0.5)
+                while source_index < wanted and cap.grab():
+                    source_index += 1
             ret, frame = cap.read()
             if not ret:
                 if debug:
                     print(f"End of video reached at frame {frame_count}")
                 break
+            source_index += 1
 
             try:
-                # Recalibrate crop region every 30 frames or on first frame
-                if frame_count % 30 == 0 or current_crop is None:
-                    current_crop = self.measurements(frame)
-
                 # Convert to grayscale
-                if len(frame.shape) == 3:
+                if len(frame.shape) == 3 and full_gray:
                     frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
                 else:
                     frame_gray = frame
 
-                # Apply crop
-                y1, y2, x1, x2 = current_crop
-                cropped = frame_gray[y1:y2, x1:x2]
-                
-                # Ensure cropped region is not empty
-                if cropped.size == 0:
-                    if debug:
-                        print(f"Empty crop at frame {frame_count}, using default")
-                    h, w = frame_gray.shape
-                    cropped = frame_gray[h//4:3*h//4, w//4:3*w//4]
-
-                # Resize with padding
-                resized = self.resize_with_horizontal_padding(cropped)
-                processed = resized.numpy().squeeze()
-
-                # Ensure correct dimensions
-                if processed.shape != (self.target_height, self.target_width):
-                    processed = cv2.resize(processed, (self.target_width, self.target_height))
-
-                # Normalize to [0, 1]
-                processed = processed.astype(np.float32) / 255.0
-                frames.append(processed)
-                
-                if debug and frame_count < 5:
-                    print(f"Frame {frame_count}: shape={processed.shape}, min={processed.min():.3f}, max={processed.max():.3f}")
+                if batch_keyframes:
+                    if frame_count % self.recalibrate_every == 0:
+                        if len(pending_keyframes) >= self.landmark_batch_size:
+                            self._flush_keyframes(pending, pending_keyframes, crop_state, frames, debug)
+                            pending_bytes = 0
+                        pending_keyframes.append((frame_count, frame))
+                    elif pending_bytes >= MAX_PENDING_BYTES:
+                        self._flush_keyframes(pending, pending_keyframes, crop_state, frames, debug)
+                        pending_bytes = 0
+                    pending.append((frame_count, frame))
+                    pending_bytes += frame.nbytes
+                else:
+                    # Detect or track the crop region for this frame
+                    current_crop = self._update_crop(frame, frame_gray, frame_count, crop_state)
+                    self._crop_and_resize(frame_gray, current_crop, frame_count, frames[frame_count], debug)
                 
                 frame_count += 1
                 
             except Exception as e:
                 print(f"Error processing frame {frame_count}: {e}")
                 # Add a zero frame to continue processing
-                frames.append(np.zeros((self.target_height, self.target_width), dtype=np.float32))
+                if batch_keyframes:
+                    pending.append((frame_count, None))
+                else:
+                    frames[frame_count] = 0
                 frame_count += 1
 
+        if batch_keyframes:
+            self._flush_keyframes(pending, pending_keyframes, crop_state, frames, debug)
+
         cap.release()
 
-        # Pad with last frame or zeros if needed
-        while len(frames) < self.max_frames:
-            if len(frames) > 0:
-                frames.append(frames[-1].copy())
-            else:
-                frames.append(np.zeros((self.target_height, self.target_width), dtype=np.float32))
+        if stats is not None:
+            stats.update({
+                'frames_read': frame_count,
+                'source_frames': source_index,
+                'source_fps': source_fps,
+                'detections': crop_state['detections'],
+                'tracked_frames': crop_state['tracked_frames']
+            })
+            if frame_count == 0:
+                stats['error'] = f"No frames decoded from video: {path_label}"
+        if debug:
+            print(f"Landmark detections: {crop_state['detections']}, tracked frames: {crop_state['tracked_frames']}")
+
+        # Pad with last frame in one broadcast (the buffer is already zero if nothing was read)
+        if 0 < frame_count < self.max_frames:
+            frames[frame_count:] = frames[frame_count - 1]
 
         if debug:
             print(f"Final frames count: {len(frames)}")
+            print(f"Final array shape: {frames_array.shape}")
+            print(f"Data range: [{frames_array.min()}, {frames_array.max()}]")
+        
+        return frames_array
 
-        # Stack and add batch/channel dimensions
-        try:
-            frames_array = np.stack(frames)  # (75, 50, 100)
-            frames_array = np.expand_dims(frames_array, axis=0)  # (1, 75, 50, 100)
-            frames_array = np.expand_dims(frames_array, axis=-1)  # (1, 75, 50, 100, 1)
-            
-            if debug:
-                print(f"Final array shape: {frames_array.shape}")
-                print(f"Data range: [{frames_array.min():.3f}, {frames_array.max():.3f}]")
-            
-            return frames_array
-            
-        except Exception as e:
-            print(f"Error stacking frames: {e}")
-            return self._create_empty_frames()
+    def _failed(self, message, stats=None):
+        """Report a video that could not be read, returns the all-zero clip"""
+        print(f"Error: {message}")
+        if stats is not None:
+            stats['error'] = message
+        return self._create_empty_frames()
+
+    # Shared all-zero clips, keyed by (max_frames, height, width)
+    _empty_frames_cache = {}
 
     def _create_empty_frames(self):
-        """Create empty frame array with correct dimensions"""
-        empty = np.zeros((self.target_height, self.target_width), dtype=np.float32)
-        frames = [empty] * self.max_frames
-        frames_array = np.stack(frames)
-        frames_array = np.expand_dims(frames_array, axis=0)
-        frames_array = np.expand_dims(frames_array, axis=-1)
-        return frames_array
+        """Empty frame array with correct dimensions
+
+        The same read-only array is returned every time for a given shape;
+        copy it before writing.
+        """
+        key = (self.max_frames, self.target_height, self.target_width)
+        empty = VideoPreprocessor._empty_frames_cache.get(key)
+        if empty is None:
+            empty = np.zeros((1,) + key + (1,), dtype=np.uint8)
+            empty.setflags(write=False)
+            VideoPreprocessor._empty_frames_cache[key] = empty
+        return empty
 
 
 # Enhanced prediction function
@@ -232,7 +691,7 @@ def predict_video(video_path, model=None, label_encoder=None, max_frames=75, deb
         
         if debug:
             print(f"Processed frames shape: {frames.shape}")
-            print(f"Frames data range: [{frames.min():.3f}, {frames.max():.3f}]")
+            print(f"Frames data range: [{frames.min()}, {frames.max()}]")
         
         # Check if frames are valid
         if np.all(frames == 0):
@@ -240,21 +699,17 @@ def predict_video(video_path, model=None, label_encoder=None, max_frames=75, deb
         
         # Make prediction
         print("Making prediction...")
-        y_pred = model.predict(frames, verbose=0)
+        y_pred = model.predict(to_float_input(frames), verbose=0)
         
         if debug:
             print(f"Prediction shape: {y_pred.shape}")
             print(f"Prediction sample: {y_pred[0, :5, :5]}")  # Show first 5x5 of prediction
         
-        # Decode using CTC
-        decoded, _ = tf.keras.backend.ctc_decode(
-            y_pred,
-            input_length=np.ones(y_pred.shape[0]) * y_pred.shape[1],
-            greedy=True
-        )
+        # Decode using greedy CTC
+        sequences, _, _ = greedy_ctc_decode(y_pred)
         
         # Convert to words
-        sequence = decoded[0].numpy()[0]
+        sequence = sequences[0]
         
         if debug:
             print(f"Decoded sequence: {sequence}")
@@ -302,6 +757,7 @@ def load_trained_model(model_path='lipreading_model_predict.h5', label_encoder_p
             print(f"Error: Label encoder file not found: {label_encoder_path}")
             return None, None
         
+        from tensorflow.keras.models import load_model
         model = load_model(model_path)
         with open(label_encoder_path, 'rb') as f:
             label_encoder = pickle.load(f)
@@ -0,0 +1,230 @@
+import io
+import json
+import os
+import shutil
+import subprocess
+import threading
+
+import cv2
+import numpy as np
+
+try:
+    import av
+except ImportError:  # PyAV is optional, the ffmpeg pipe is used instead
+    av = None
+
+
+def open_video(source):
+    """Open a video for frame-by-frame reading
+
+    ``source`` may be a filesystem path, a bytes-like object, or a readable
+    binary file object. Paths go through ``cv2.VideoCapture`` as before.
+    In-memory sources are demuxed and decoded without touching the
+    filesystem, through PyAV when it is installed, otherwise through a local
+    ffmpeg process fed over a pipe.
+
+    Every reader returned here has the subset of the ``cv2.VideoCapture`` API
+    that ``VideoPreprocessor`` uses: ``isOpened``, ``read``, ``grab``,
+    ``retrieve``, ``get`` and ``release``.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return cv2.VideoCapture(os.fspath(source))
+    if av is not None:
+        return PyAVCapture(source)
+    return FFmpegPipeCapture(source)
+
+
+def decode_image(data):
+    """Decode one encoded image (JPEG, PNG, ...) to a BGR frame, None if it is not an image"""
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if buffer.size == 0:
+        return None
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+
+def _as_file(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return source
+
+
+def _as_bytes(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return source.read()
+
+
+class PyAVCapture:
+    """Decodes an in-memory video with PyAV"""
+
+    def __init__(self, source):
+        self._container = None
+        self._frame = None
+        try:
+            self._container = av.open(_as_file(source), mode='r')
+            self._stream = self._container.streams.video[0]
+            self._stream.thread_type = 'AUTO'
+            self._frames = self._container.decode(self._stream)
+        except Exception as e:
+            print(f"Error: Could not open in-memory video: {e}")
+            self.release()
+
+    def isOpened(self):
+        return self._container is not None
+
+    def get(self, prop):
+        if self._container is None:
+            return 0.0
+        stream = self._stream
+        if prop == cv2.CAP_PROP_FPS:
+            rate = stream.average_rate or stream.guessed_rate or stream.base_rate
+            return float(rate) if rate else 0.0
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            if stream.frames:
+                return float(stream.frames)
+            # Containers such as WebM from MediaRecorder carry no frame count
+            return -1.0
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(stream.codec_context.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(stream.codec_context.height)
+        return 0.0
+
+    def grab(self):
+        if self._container is None:
+            return False
+        try:
+            self._frame = next(self._frames)
+            return True
+        except (StopIteration, av.error.EOFError):
+            self._frame = None
+            return False
+        except Exception as e:
+            print(f"Error decoding in-memory video: {e}")
+            self._frame = None
+            return False
+
+    def retrieve(self):
+        if self._frame is None:
+            return False, None
+        return True, self._frame.to_ndarray(format='bgr24')
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def release(self):
+        if self._container is not None:
+            self._container.close()
+            self._container = None
+
+
+class FFmpegPipeCapture:
+    """Decodes an in-memory video through ffmpeg over stdin/stdout pipes
+
+    Inputs are not seekable on a pipe. MP4 files therefore need their moov
+    atom at the front ("faststart"). WebM and MKV always work.
+    """
+
+    def __init__(self, source):
+        self._process = None
+        self._writer = None
+        self._frame = None
+        self._info = {}
+        try:
+            if shutil.which('ffmpeg') is None or shutil.which('ffprobe') is None:
+                raise RuntimeError('ffmpeg/ffprobe not found and PyAV is not installed')
+            data = _as_bytes(source)
+            self._info = self._probe(data)
+            self._frame_size = self._info['width'] * self._info['height'] * 3
+            self._process = subprocess.Popen(
+                ['ffmpeg', '-loglevel', 'error', '-i', 'pipe:0', '-map', '0:v:0',
+                 '-f', 'rawvideo', '-pix_fmt', 'bgr24', 'pipe:1'],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+            )
+            # Feed stdin from a thread so a full stdout pipe cannot deadlock us
+            self._writer = threading.Thread(target=self._feed, args=(data,), daemon=True)
+            self._writer.start()
+        except Exception as e:
+            print(f"Error: Could not open in-memory video: {e}")
+            self.release()
+
+    @staticmethod
+    def _probe(data):
+        result = subprocess.run(
+            ['ffprobe', '-loglevel', 'error', '-select_streams', 'v:0',
+             '-show_entries', 'stream=width,height,avg_frame_rate,nb_frames',
+             '-of', 'json', 'pipe:0'],
+            input=data, capture_output=True, check=True
+        )
+        stream = json.loads(result.stdout)['streams'][0]
+        num, _, den = stream.get('avg_frame_rate', '0/1').partition('/')
+        fps = float(num) / float(den) if den and float(den) else 0.0
+        nb_frames = stream.get('nb_frames')
+        return {
+            'width': int(stream['width']),
+            'height': int(stream['height']),
+            'fps': fps,
+            'frames': int(nb_frames) if nb_frames and nb_frames.isdigit() else -1
+        }
+
+    def _feed(self, data):
+        try:
+            self._process.stdin.write(data)
+        except (BrokenPipeError, ValueError):
+            pass
+        finally:
+            try:
+                self._process.stdin.close()
+            except Exception:
+                pass
+
+    def isOpened(self):
+        return self._process is not None
+
+    def get(self, prop):
+        if not self._info:
+            return 0.0
+        if prop == cv2.CAP_PROP_FPS:
+            return self._info['fps']
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self._info['frames'])
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self._info['width'])
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self._info['height'])
+        return 0.0
+
+    def grab(self):
+        if self._process is None:
+            return False
+        raw = self._process.stdout.read(self._frame_size)
+        if len(raw) < self._frame_size:
+            self._frame = None
+            return False
+        self._frame = raw
+        return True
+
+    def retrieve(self):
+        if self._frame is None:
+            return False, None
+        # Read-only view over the pipe buffer, no copy
+        frame = np.frombuffer(self._frame, dtype=np.uint8).reshape(self._info['height'], self._info['width'], 3)
+        return True, frame
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def release(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.stdout.close()
+            self._process.wait()
+            self._process = None
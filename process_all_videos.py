@@ -1,75 +1,216 @@
-import face_alignment
-import cv2
-import os
-import numpy as np
-import subprocess
-from pathlib import Path
-
-# Load face alignment model once
-fa = face_alignment.FaceAlignment(face_alignment.LandmarksType.TWO_D, device='cpu', flip_input=False)
-
-# Input/output base dirs
-input_base = Path("videos/videos")
-output_base = Path("crop_videos")
-
-# Ensure output root exists
-output_base.mkdir(parents=True, exist_ok=True)
-
-# Function to process a single video
-def process_video(input_path: Path, output_path: Path):
-    temp_audio = "temp_audio.mp3"
-    temp_cropped = "temp_cropped.mp4"
-
-    # Extract audio
-    subprocess.run(["ffmpeg", "-y", "-i", str(input_path), "-q:a", "0", "-map", "a", temp_audio], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-
-    # Open video
-    cap = cv2.VideoCapture(str(input_path))
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    out = cv2.VideoWriter(temp_cropped, cv2.VideoWriter_fourcc(*'mp4v'), fps, (128, 128))
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        preds = fa.get_landmarks(frame)
-        if preds:
-            landmarks = preds[0]
-            lips = landmarks[48:68]
-            x, y, w, h = cv2.boundingRect(np.array(lips))
-            margin = 10
-            x = max(x - margin, 0)
-            y = max(y - margin, 0)
-            cropped = frame[y:y + h + 2 * margin, x:x + w + 2 * margin]
-            if cropped.size == 0:
-                continue
-            cropped = cv2.resize(cropped, (128, 128))
-            out.write(cropped)
-
-    cap.release()
-    out.release()
-
-    # Merge with audio
-    subprocess.run([
-        "ffmpeg", "-y", "-i", temp_cropped, "-i", temp_audio,
-        "-c:v", "copy", "-c:a", "aac", "-strict", "experimental",
-        str(output_path)
-    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-
-    # Cleanup temp files
-    os.remove(temp_audio)
-    os.remove(temp_cropped)
-    print(f"✅ Processed: {input_path} → {output_path}")
-
-# Walk through input directories
-for speaker_folder in input_base.glob("s*"):
-    if not speaker_folder.is_dir():
-        continue
-
-    out_speaker_folder = output_base / speaker_folder.name
-    out_speaker_folder.mkdir(parents=True, exist_ok=True)
-
-    for video_file in speaker_folder.glob("*.mp4"):
-        out_path = out_speaker_folder / video_file.name
-        process_video(video_file, out_path)
+import face_alignment
+import cv2
+import os
+import time
+import argparse
+import numpy as np
+import subprocess
+from multiprocessing import Pool
+from pathlib import Path
+
+# Face alignment model, loaded once per worker process by init_worker
+fa = None
+init_error = None
+
+# Default input/output base dirs
+INPUT_BASE = Path("videos/videos")
+OUTPUT_BASE = Path("crop_videos")
+
+# Side of the square mouth crop written to the output videos
+CROP_SIZE = 128
+
+# Frames before the first face detection wait for it, so they get the first
+# detected box; past this many they are written with the default mouth region
+MAX_LEADING_FRAMES = 75
+
+
+def init_worker(device, threads):
+    """Load one face alignment model per worker and keep torch from oversubscribing the CPUs"""
+    global fa, init_error
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        cv2.setNumThreads(1)
+        fa = face_alignment.FaceAlignment(face_alignment.LandmarksType.TWO_D, device=device, flip_input=False)
+    except Exception as e:
+        # Raising here would make the pool respawn workers forever; report it per job instead
+        init_error = f"Worker failed to load the face alignment model: {e}"
+
+
+def mouth_crop(frame, box, margin):
+    """The resized mouth crop of one frame; the default mouth region if there is no box or it is empty"""
+    if box is not None:
+        x, y, w, h = box
+        cropped = frame[y:y + h + 2 * margin, x:x + w + 2 * margin]
+        if cropped.size:
+            return cv2.resize(cropped, (CROP_SIZE, CROP_SIZE))
+    # Lower middle of the frame, where the mouth sits in a talking-head shot
+    height, width = frame.shape[:2]
+    cropped = frame[int(height * 0.4):int(height * 0.8), int(width * 0.2):int(width * 0.8)]
+    return cv2.resize(cropped, (CROP_SIZE, CROP_SIZE))
+
+
+# Function to process a single video
+def process_video(input_path: Path, output_path: Path):
+    # Written next to the output and renamed at the end, so an interrupted job never looks finished
+    partial_output = output_path.with_name(output_path.stem + ".partial" + output_path.suffix)
+
+    # Open video
+    cap = cv2.VideoCapture(str(input_path))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+
+    # One ffmpeg pass: cropped frames come in raw on stdin, the original audio stream is copied
+    # straight from the source (no MP3 round trip, no intermediate video file)
+    ffmpeg = subprocess.Popen([
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{CROP_SIZE}x{CROP_SIZE}", "-r", f"{fps}", "-i", "pipe:0",
+        "-i", str(input_path),
+        "-map", "0:v:0", "-map", "1:a:0?",
+        "-c:v", "mpeg4", "-q:v", "2", "-c:a", "copy",
+        "-f", "mp4", str(partial_output)
+    ], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    frames = 0
+    box = None
+    margin = 10
+    leading = []
+    aborted = False
+
+    def write(batch, box):
+        nonlocal frames
+        for frame in batch:
+            ffmpeg.stdin.write(mouth_crop(frame, box, margin).tobytes())
+            frames += 1
+        batch.clear()
+
+    # Every source frame is written, so the video track keeps the length and timing of the
+    # copied audio: a missed detection reuses the last box and an empty crop falls back to
+    # the default mouth region
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+
+            preds = fa.get_landmarks(frame)
+            if preds:
+                landmarks = preds[0]
+                lips = landmarks[48:68]
+                x, y, w, h = cv2.boundingRect(np.array(lips))
+                x = max(x - margin, 0)
+                y = max(y - margin, 0)
+                box = (x, y, w, h)
+            if box is None:
+                leading.append(frame)
+                if len(leading) >= MAX_LEADING_FRAMES:
+                    write(leading, None)
+                continue
+
+            # Frames that came before the first detection get its box
+            write(leading, box)
+            write([frame], box)
+        write(leading, box)
+    except BrokenPipeError:
+        pass  # ffmpeg exited early, its error is reported below
+    except Exception:
+        aborted = True  # e.g. landmark detection failed, the partial output is dropped below
+        raise
+    finally:
+        cap.release()
+        try:
+            ffmpeg.stdin.close()
+        except BrokenPipeError:
+            pass
+        stderr = ffmpeg.stderr.read()
+        ffmpeg.wait()
+        if aborted and partial_output.exists():
+            partial_output.unlink()
+
+    if ffmpeg.returncode != 0 or not partial_output.exists():
+        if partial_output.exists():
+            partial_output.unlink()
+        raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='replace').strip()[-500:]}")
+    if box is None:
+        partial_output.unlink()
+        raise RuntimeError("no face found in any frame")
+    os.replace(partial_output, output_path)
+    return frames
+
+
+def run_job(job):
+    """Worker entry point: process one video, never raise"""
+    input_path, output_path = job
+    start = time.perf_counter()
+    try:
+        if init_error:
+            raise RuntimeError(init_error)
+        frames = process_video(input_path, output_path)
+        return input_path, output_path, frames, time.perf_counter() - start, None
+    except Exception as e:
+        return input_path, output_path, 0, time.perf_counter() - start, str(e)
+
+
+def collect_jobs(input_base: Path, output_base: Path, force=False):
+    """Every (input, output) pair still to do; finished outputs are skipped so runs can resume"""
+    jobs = []
+    skipped = 0
+    # Walk through input directories
+    for speaker_folder in sorted(input_base.glob("s*")):
+        if not speaker_folder.is_dir():
+            continue
+
+        out_speaker_folder = output_base / speaker_folder.name
+        out_speaker_folder.mkdir(parents=True, exist_ok=True)
+
+        for video_file in sorted(speaker_folder.glob("*.mp4")):
+            out_path = out_speaker_folder / video_file.name
+            if not force and out_path.exists() and out_path.stat().st_size > 0:
+                skipped += 1
+                continue
+            jobs.append((video_file, out_path))
+    return jobs, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crop the mouth region out of every speaker video")
+    parser.add_argument("--input", type=Path, default=INPUT_BASE)
+    parser.add_argument("--output", type=Path, default=OUTPUT_BASE)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes, one face alignment model each")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--force", action="store_true", help="Redo videos whose output already exists")
+    args = parser.parse_args()
+
+    # Ensure output root exists
+    args.output.mkdir(parents=True, exist_ok=True)
+
+    jobs, skipped = collect_jobs(args.input, args.output, force=args.force)
+    print(f"{len(jobs)} videos to process, {skipped} already done, {args.workers} workers")
+    if not jobs:
+        return
+
+    workers = max(1, min(args.workers, len(jobs)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    done = failed = total_frames = 0
+    start = time.perf_counter()
+
+    with Pool(workers, initializer=init_worker, initargs=(args.device, threads)) as pool:
+        for input_path, output_path, frames, elapsed, error in pool.imap_unordered(run_job, jobs):
+            done += 1
+            if error:
+                failed += 1
+                print(f"❌ [{done}/{len(jobs)}] {input_path}: {error}")
+                continue
+            total_frames += frames
+            wall = time.perf_counter() - start
+            rate = done / wall
+            eta = (len(jobs) - done) / rate if rate > 0 else 0
+            print(f"✅ [{done}/{len(jobs)}] {input_path} → {output_path} ({frames} frames, {elapsed:.1f}s) "
+                  f"| {rate * 60:.1f} videos/min, ETA {eta / 60:.1f} min")
+
+    wall = time.perf_counter() - start
+    print(f"Done in {wall / 60:.1f} min: {done - failed} processed, {failed} failed, {skipped} skipped, "
+          f"{(done - failed) / wall * 60:.1f} videos/min, {total_frames / wall:.1f} frames/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -427,6 +427,8 @@ const RealTimeFaceDetection = ({ videoPath, isVisible }) => {
   const canvasRef = useRef(null);
   const videoRef = useRef(null);
   const intervalRef = useRef(null);
+  // One face-tracking session per viewer, so two viewers of the same video never share a face box
+  const sessionIdRef = useRef<string | null>(null);
   const [isProcessing, setIsProcessing] = useState(false);
   const [detectionMode, setDetectionMode] = useState('python'); // 'python' or 'js'
   const [landmarks, setLandmarks] = useState([]);
@@ -449,22 +451,25 @@ const RealTimeFaceDetection = ({ videoPath, isVisible }) => {
     // Draw current frame
     ctx.drawImage(videoElement, 0, 0, canvas.width, canvas.height);
     
-    // Convert to base64
-    const imageData = canvas.toDataURL('image/jpeg', 0.8);
+    // Encode as JPEG and send the raw bytes (no base64/JSON round trip)
+    const imageBlob = await new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', 0.8));
+    if (!imageBlob) return;
     
     try {
       const startTime = performance.now();
       
-      // Call Python backend (you'll need to implement this endpoint)
+      // Frames of the same video in this viewer share a session, so the backend can track the face.
+      // Created on first use; crypto.randomUUID is not available over plain http
+      if (!sessionIdRef.current) {
+        sessionIdRef.current = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+      }
       const response = await fetch('/api/detect-face', {
         method: 'POST',
         headers: {
-          'Content-Type': 'application/json',
+          'Content-Type': 'image/jpeg',
+          'X-Session-Id': `${sessionIdRef.current}:${encodeURIComponent(videoPath || '')}`
         },
-        body: JSON.stringify({
-          image: imageData,
-          video_path: videoPath
-        })
+        body: imageBlob
       });
       
       if (response.ok) {